@@ -6,6 +6,96 @@ class Settings(BaseSettings):
     secret_key: str
     frontend_url: list[str]
 
+    # Réplicas de lectura: GET sin escrituras recientes del usuario
+    read_replica_urls: list[str] = []
+    read_your_writes_seconds: float = 10
+
+    # Sharding de los datos del diario por user_id: {"nombre": url}.
+    # Vacío = todo en database_url. Los shards nuevos se añaden al final.
+    shard_urls: dict[str, str] = {}
+    shard_virtual_nodes: int = 100
+    # Ids en cada shard: shard_id_start + índice + n * shard_id_stride
+    shard_id_start: int = 1_000_000_000
+    shard_id_stride: int = 64
+    shard_rebalance_batch_size: int = 500
+    # Usuarios que se bloquean y mueven juntos, y espera tras bloquearlos para
+    # que terminen sus peticiones en curso
+    shard_move_batch_users: int = 200
+    shard_move_grace_seconds: float = 30
+
+    # Compresión de respuestas
+    compression_minimum_size: int = 1024
+    compression_thread_threshold: int = 256 * 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_zstd_level: int = 3
+    compression_exclude_paths: list[str] = ["/uploads", "/media/upload"]
+
+    # Idempotency-Key en POST que crean entradas o suben archivos
+    idempotency_paths: list[str] = ["/diary/entries", "/media/upload/audio", "/media/upload/drawing"]
+    idempotency_ttl_seconds: int = 86400
+    idempotency_max_entries: int = 10000
+    idempotency_max_response_size: int = 256 * 1024
+
+    # Control de admisión de /auth (bcrypt)
+    auth_ip_rate_per_minute: float = 20
+    auth_ip_burst: int = 10
+    auth_email_rate_per_minute: float = 5
+    auth_email_burst: int = 5
+    auth_max_concurrent_hashes: int = 0  # 0 = la mitad de los núcleos
+    # Proxies (IPs o redes) cuya cabecera X-Forwarded-For se acepta para
+    # obtener la IP del cliente. Vacío = se usa la IP de la conexión
+    trusted_proxies: list[str] = []
+    # Token para GET /auth/admission-stats (cabecera X-Admin-Token). Vacío = desactivado
+    admission_stats_token: str = ""
+
+    # Refresh tokens
+    refresh_token_expire_days: int = 14
+    revocation_purge_seconds: int = 3600
+
+    # Reconciliación de archivos multimedia huérfanos
+    # Lo ejecuta el worker de trabajos (o la app con media_sweeper_in_app);
+    # un lease en la base evita pasadas simultáneas. 0 = desactivado
+    media_sweeper_interval_seconds: int = 900
+    media_sweeper_in_app: bool = False
+    media_sweeper_lease_seconds: int = 600
+    media_sweeper_batch_size: int = 500
+    media_sweeper_pause_seconds: float = 0.1
+    media_sweeper_grace_seconds: int = 3600
+    media_quarantine_dir: str = "quarantine"  # "" = borrar directamente
+
+    # Almacenamiento de multimedia: "local" o "s3"
+    storage_backend: str = "local"
+    storage_local_root: str = "uploads"
+    s3_bucket: str = ""
+    s3_prefix: str = ""
+    s3_endpoint_url: str | None = None  # p. ej. http://localhost:9000 (MinIO)
+    s3_region: str | None = None
+    s3_access_key_id: str | None = None
+    s3_secret_access_key: str | None = None
+    s3_max_pool_connections: int = 20
+    s3_multipart_part_size: int = 8 * 1024 * 1024
+
+    # Cola de trabajos en segundo plano (python -m jobs.worker)
+    jobs_worker_concurrency: int = 4
+    jobs_poll_interval_seconds: float = 1.0
+    jobs_lease_seconds: int = 300
+    jobs_max_attempts: int = 5
+    jobs_backoff_base_seconds: float = 5
+    jobs_backoff_max_seconds: float = 3600
+    jobs_retention_days: int = 7
+
+    # Eventos en tiempo real (SSE): "memory" o "redis" entre workers
+    events_backend: str = "memory"
+    events_redis_url: str = "redis://localhost:6379/0"
+    events_queue_size: int = 100
+    events_heartbeat_seconds: float = 15
+
+    # Subidas reanudables de audio
+    upload_sessions_dir: str = "upload_sessions"
+    upload_max_size: int = 200 * 1024 * 1024
+    upload_session_expire_hours: int = 24
+
 
     class Config:
         env_file = ".env"
@@ -1,5 +1,9 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, declarative_base
+import itertools
+import math
+import time
+from fastapi import Depends, Request, Response
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from config import settings
 
 
@@ -8,12 +12,93 @@ engine = create_engine(settings.database_url, echo=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Réplicas de solo lectura (opcionales); se reparten en round-robin
+read_engines = [create_engine(url, echo=True) for url in settings.read_replica_urls]
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+]
+_next_replica = itertools.cycle(ReadSessionLocals) if ReadSessionLocals else None
 
 
-def get_db():
-    db = SessionLocal()
+# Marca de la última escritura del cliente. Viaja con él (cookie o
+# cabecera) para que cualquier worker sepa que debe leer del primario
+LAST_WRITE_COOKIE = "sintiendo_last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_write(session):
+    response = session.info.get("response")
+    if session.info.pop("has_writes", False) and response is not None:
+        marker = f"{time.time():.3f}"
+        response.set_cookie(
+            LAST_WRITE_COOKIE, marker, max_age=max(1, math.ceil(settings.read_your_writes_seconds)),
+            httponly=True, samesite="lax"
+        )
+        response.headers[LAST_WRITE_HEADER] = marker
+
+
+def wrote_recently(request: Request) -> bool:
+    """
+    Si el cliente confirmó una escritura hace menos de
+    `read_your_writes_seconds`, según la marca que devuelve: la cookie
+    (navegadores en el mismo sitio) o la cabecera X-Last-Write, que CORS
+    expone para que el SPA en otro dominio la reenvíe, igual que el resto de
+    clientes. La marca solo decide a qué base se lee; la autenticación la
+    sigue haciendo get_current_user. Una marca futura no cuenta, para que no
+    fije al cliente en el primario.
+    """
+    marker = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        written_at = float(marker)
+    except (TypeError, ValueError):
+        return False
+    return 0 <= time.time() - written_at < settings.read_your_writes_seconds
+
+
+# Las sesiones de las peticiones no expiran al hacer commit: las escrituras
+# construyen la respuesta con lo devuelto por RETURNING, sin recargar los
+# objetos. Los procesos en segundo plano mantienen el comportamiento por defecto.
+REQUEST_SESSION_OPTIONS = {"expire_on_commit": False}
+
+
+def get_db(response: Response):
+    db = SessionLocal(**REQUEST_SESSION_OPTIONS)
+    # Para devolver la marca de escritura al hacer commit
+    db.info["response"] = response
     try:
         yield db
     finally:
         db.close()
 
+
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """
+    Sesión para handlers de solo lectura.
+
+    Usa una réplica si hay configuradas, la petición es GET/HEAD y el cliente
+    no ha escrito recientemente; si no, comparte la sesión del primario de
+    get_db (que no abre conexión hasta su primera consulta).
+    """
+    if (_next_replica is None or request.method not in ("GET", "HEAD")
+            or wrote_recently(request)):
+        yield db
+        return
+
+    replica = next(_next_replica)()
+    try:
+        yield replica
+    finally:
+        replica.close()
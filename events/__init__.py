@@ -0,0 +1,51 @@
+import logging
+from functools import lru_cache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import settings
+from events.broker import InProcessBroker, RedisBroker
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache
+def get_broker() -> InProcessBroker:
+    """Broker de eventos configurado (compartido por todo el proceso)"""
+    if settings.events_backend == "redis":
+        return RedisBroker(settings.events_redis_url, queue_size=settings.events_queue_size)
+    return InProcessBroker(settings.events_queue_size)
+
+
+def queue_event(db: Session, user_id: int, event_type: str, data: dict):
+    """
+    Programar un evento para el usuario; se publica solo si la transacción
+    de la sesión hace commit (y se descarta en rollback).
+    """
+    db.info.setdefault("pending_events", []).append(
+        (user_id, {"type": event_type, "data": data})
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    # Los datos ya están confirmados: un fallo del broker no debe propagarse
+    # como error de la petición. El evento se pierde y los clientes lo
+    # recuperan con /diary/changes.
+    pending = session.info.pop("pending_events", None)
+    if not pending:
+        return
+    try:
+        broker = get_broker()
+    except Exception:
+        logger.exception("Broker de eventos no disponible; se descartan %s eventos", len(pending))
+        return
+    for user_id, payload in pending:
+        try:
+            broker.publish(user_id, payload)
+        except Exception:
+            logger.exception("No se pudo publicar el evento %s del usuario %s", payload["type"], user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("pending_events", None)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+# redis solo es necesario si se configura el backend entre workers
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Pub/sub en memoria por usuario.
+
+    Cada conexión SSE tiene su propia cola acotada en el event loop que la
+    atiende. `publish` se puede llamar desde cualquier hilo (los handlers
+    síncronos corren en el threadpool): los eventos se entregan con
+    call_soon_threadsafe. Si un cliente no consume, se descartan sus eventos
+    más antiguos.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def deliver(self, user_id: int, event: dict):
+        """Entregar a las conexiones de este proceso"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Event loop cerrado: la conexión ya terminó
+                pass
+
+    def publish(self, user_id: int, event: dict):
+        self.deliver(user_id, event)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Pub/sub entre workers a través de Redis.
+
+    `publish` envía a un canal por usuario; un hilo por proceso escucha
+    todos los canales y entrega localmente con el broker en memoria.
+    """
+
+    def __init__(self, url: str, channel_prefix: str = "sintiendo:events:", queue_size: int = 100):
+        if redis is None:
+            raise RuntimeError("El backend de eventos redis requiere el paquete redis")
+        super().__init__(queue_size)
+        self.channel_prefix = channel_prefix
+        self.client = redis.Redis.from_url(url)
+        self._listener = threading.Thread(target=self._listen, name="events-redis", daemon=True)
+        self._listener.start()
+
+    def publish(self, user_id: int, event: dict):
+        self.client.publish(f"{self.channel_prefix}{user_id}", json.dumps(event, default=str))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{self.channel_prefix}*")
+                for message in pubsub.listen():
+                    channel = message["channel"].decode()
+                    user_id = int(channel[len(self.channel_prefix):])
+                    self.deliver(user_id, json.loads(message["data"]))
+            except Exception:
+                logger.exception("Conexión con Redis perdida; reintentando")
+                threading.Event().wait(1)
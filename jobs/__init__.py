@@ -0,0 +1,48 @@
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models.job import BackgroundJob, JOB_PENDING
+from config import settings
+
+# Funciones que ejecutan cada tipo de trabajo (registradas con @handler)
+HANDLERS: dict[str, Callable] = {}
+
+
+def handler(job_type: str):
+    """Registrar la función (síncrona o async) que procesa un tipo de trabajo"""
+    def register(function: Callable) -> Callable:
+        HANDLERS[job_type] = function
+        return function
+    return register
+
+
+def enqueue_many(db: Session, job_type: str, payloads: Iterable[dict],
+                 delay_seconds: float = 0, max_attempts: Optional[int] = None):
+    """
+    Encolar trabajos dentro de la transacción de la sesión.
+
+    No hace commit: los trabajos se confirman (o descartan) junto con la
+    escritura que los origina, y el worker solo los ve tras el commit.
+    """
+    run_at = datetime.utcnow() + timedelta(seconds=delay_seconds)
+    rows = [
+        {
+            "job_type": job_type,
+            "payload": json.dumps(payload),
+            "status": JOB_PENDING,
+            "attempts": 0,
+            "max_attempts": max_attempts or settings.jobs_max_attempts,
+            "run_at": run_at
+        }
+        for payload in payloads
+    ]
+    if rows:
+        db.execute(insert(BackgroundJob), rows)
+
+
+def enqueue(db: Session, job_type: str, payload: dict, delay_seconds: float = 0,
+            max_attempts: Optional[int] = None):
+    """Encolar un trabajo dentro de la transacción de la sesión"""
+    enqueue_many(db, job_type, [payload], delay_seconds, max_attempts)
@@ -0,0 +1,12 @@
+from jobs import handler
+from storage import get_storage
+
+# Tipos de trabajo
+DELETE_MEDIA_FILE = "media.delete_file"
+
+
+@handler(DELETE_MEDIA_FILE)
+async def delete_media_file(payload: dict):
+    """Borrar del almacenamiento el archivo de un registro multimedia eliminado"""
+    storage = get_storage()
+    await storage.delete(storage.key_for(payload["file_path"]))
@@ -0,0 +1,60 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models.job import MaintenanceLease
+
+
+def lease_holder() -> str:
+    """Identificador de quien toma un lease (único por llamada)"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+def acquire_lease(name: str, holder: str, seconds: int) -> bool:
+    """
+    Tomar o renovar el lease `name` durante `seconds`.
+
+    Vive en el primario, compartido por todos los procesos: solo se concede
+    si está libre, caducado o ya es de `holder`.
+    """
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        updated = db.query(MaintenanceLease).filter(
+            MaintenanceLease.name == name,
+            or_(
+                MaintenanceLease.locked_until.is_(None),
+                MaintenanceLease.locked_until < now,
+                MaintenanceLease.locked_by == holder
+            )
+        ).update({
+            MaintenanceLease.locked_by: holder,
+            MaintenanceLease.locked_until: now + timedelta(seconds=seconds)
+        }, synchronize_session=False)
+        if updated:
+            db.commit()
+            return True
+        if db.get(MaintenanceLease, name) is not None:
+            return False
+
+        # Primera vez que se usa este lease
+        db.add(MaintenanceLease(name=name, locked_by=holder, locked_until=now + timedelta(seconds=seconds)))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otro proceso lo creó a la vez y es suyo
+            db.rollback()
+            return False
+        return True
+
+
+def release_lease(name: str, holder: str):
+    with SessionLocal() as db:
+        db.query(MaintenanceLease).filter(
+            MaintenanceLease.name == name,
+            MaintenanceLease.locked_by == holder
+        ).update({MaintenanceLease.locked_by: None, MaintenanceLease.locked_until: None},
+                 synchronize_session=False)
+        db.commit()
@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models.job import BackgroundJob, JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from jobs import HANDLERS
+import jobs.handlers  # noqa: F401  (registra los handlers)
+from sharding import data_session_factories
+from services.MediaSweeper import start_background_sweeper
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """
+    Pool de hilos que ejecuta los trabajos de `background_jobs`.
+
+    Cada hilo reclama trabajos con SELECT ... FOR UPDATE SKIP LOCKED, así que
+    varios procesos worker pueden compartir la cola. Un trabajo reclamado
+    queda bloqueado `lease_seconds`; si el worker muere, otro lo retoma al
+    caducar; cada reclamación se marca en `locked_by` y el resultado solo
+    se registra si el trabajo sigue siendo suyo. Los fallos se reintentan con backoff exponencial hasta
+    `max_attempts`. Con shards, cada uno tiene su cola y los hilos las
+    recorren por turnos.
+    """
+
+    def __init__(self, session_factories=None, concurrency: int = None,
+                 poll_interval: float = None, lease_seconds: int = None):
+        self.session_factories = session_factories or data_session_factories()
+        self._next_factory = itertools.cycle(self.session_factories)
+        self._cycle_lock = threading.Lock()
+        self.concurrency = concurrency or settings.jobs_worker_concurrency
+        self.poll_interval = settings.jobs_poll_interval_seconds if poll_interval is None else poll_interval
+        self.lease_seconds = lease_seconds or settings.jobs_lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            and_(BackgroundJob.status == JOB_PENDING, BackgroundJob.run_at <= now),
+            and_(BackgroundJob.status == JOB_RUNNING, BackgroundJob.locked_until < now)
+        )
+
+    def claim(self, limit: int = 1) -> list[dict]:
+        """Reclamar hasta `limit` trabajos listos, de la primera cola que los tenga"""
+        for _ in self.session_factories:
+            with self._cycle_lock:
+                session_factory = next(self._next_factory)
+            claimed = self._claim_from(session_factory, limit)
+            if claimed:
+                return claimed
+        return []
+
+    def _claim_from(self, session_factory, limit: int) -> list[dict]:
+        now = datetime.utcnow()
+        with session_factory() as db:
+            # Oracle no admite FOR UPDATE con FETCH FIRST: primero candidatos
+            # por id y después el bloqueo, saltando los que ya tiene otro hilo
+            candidates = [
+                job_id for (job_id,) in db.query(BackgroundJob.id).filter(
+                    self._claimable(now)
+                ).order_by(BackgroundJob.run_at).limit(limit * 4)
+            ]
+            if not candidates:
+                return []
+
+            locked = db.query(BackgroundJob).filter(
+                BackgroundJob.id.in_(candidates),
+                self._claimable(now)
+            ).with_for_update(skip_locked=True).all()
+
+            claimed = []
+            for job in locked[:limit]:
+                job.status = JOB_RUNNING
+                job.attempts += 1
+                job.locked_until = now + timedelta(seconds=self.lease_seconds)
+                # Un token por reclamación: tampoco otro hilo de este proceso
+                # que retome el trabajo al caducar comparte el bloqueo
+                job.locked_by = f"{self.worker_id}-{uuid.uuid4().hex[:12]}"
+                claimed.append({
+                    "id": job.id,
+                    "locked_by": job.locked_by,
+                    "job_type": job.job_type,
+                    "payload": json.loads(job.payload) if job.payload else {},
+                    "attempts": job.attempts,
+                    "max_attempts": job.max_attempts,
+                    "session_factory": session_factory
+                })
+            db.commit()
+        return claimed
+
+    def _finish(self, job: dict, values: dict) -> bool:
+        """
+        Registrar el resultado si el trabajo sigue reclamado por este worker.
+        Si el bloqueo caducó y otro lo retomó, no se pisa su estado.
+        """
+        with job["session_factory"]() as db:
+            updated = db.query(BackgroundJob).filter(
+                BackgroundJob.id == job["id"],
+                BackgroundJob.locked_by == job["locked_by"],
+                BackgroundJob.locked_until > datetime.utcnow()
+            ).update({**values, BackgroundJob.locked_by: None}, synchronize_session=False)
+            db.commit()
+        if not updated:
+            logger.warning(
+                "Trabajo %s (%s): el bloqueo caducó antes de terminar, no se registra el resultado",
+                job["id"], job["job_type"]
+            )
+        return bool(updated)
+
+    def run_job(self, job: dict):
+        """Ejecutar un trabajo reclamado y registrar el resultado"""
+        try:
+            function = HANDLERS.get(job["job_type"])
+            if function is None:
+                raise LookupError(f"Tipo de trabajo desconocido: {job['job_type']}")
+            result = function(job["payload"])
+            if inspect.isawaitable(result):
+                asyncio.run(result)
+        except Exception as e:
+            if job["attempts"] >= job["max_attempts"]:
+                logger.exception("Trabajo %s (%s) fallido definitivamente", job["id"], job["job_type"])
+                self._finish(job, {
+                    BackgroundJob.status: JOB_FAILED,
+                    BackgroundJob.last_error: str(e)[:2000],
+                    BackgroundJob.finished_at: datetime.utcnow()
+                })
+                return
+            # Backoff exponencial con jitter para no reintentar todos a la vez
+            delay = min(
+                settings.jobs_backoff_base_seconds * 2 ** (job["attempts"] - 1),
+                settings.jobs_backoff_max_seconds
+            ) * random.uniform(0.8, 1.2)
+            logger.warning("Trabajo %s (%s) falló, reintento en %.0fs: %s", job["id"], job["job_type"], delay, e)
+            self._finish(job, {
+                BackgroundJob.status: JOB_PENDING,
+                BackgroundJob.last_error: str(e)[:2000],
+                BackgroundJob.run_at: datetime.utcnow() + timedelta(seconds=delay),
+                BackgroundJob.locked_until: None
+            })
+            return
+
+        self._finish(job, {
+            BackgroundJob.status: JOB_DONE,
+            BackgroundJob.locked_until: None,
+            BackgroundJob.finished_at: datetime.utcnow()
+        })
+
+    def purge_finished(self) -> int:
+        """Eliminar trabajos terminados más antiguos que la retención"""
+        cutoff = datetime.utcnow() - timedelta(days=settings.jobs_retention_days)
+        deleted = 0
+        for session_factory in self.session_factories:
+            with session_factory() as db:
+                deleted += db.query(BackgroundJob).filter(
+                    BackgroundJob.status.in_((JOB_DONE, JOB_FAILED)),
+                    BackgroundJob.finished_at < cutoff
+                ).delete(synchronize_session=False)
+                db.commit()
+        return deleted
+
+    def _loop(self, stop_event: threading.Event):
+        while not stop_event.is_set():
+            try:
+                jobs = self.claim()
+            except Exception:
+                logger.exception("Error al reclamar trabajos")
+                jobs = []
+            if not jobs:
+                stop_event.wait(self.poll_interval)
+                continue
+            for job in jobs:
+                self.run_job(job)
+
+    def run_forever(self, stop_event: threading.Event = None):
+        stop_event = stop_event or threading.Event()
+        threads = [
+            threading.Thread(target=self._loop, args=(stop_event,), name=f"job-worker-{index}", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info("Worker de trabajos iniciado con %s hilos", self.concurrency)
+        sweeper_stop = start_background_sweeper()
+
+        while not stop_event.is_set():
+            try:
+                self.purge_finished()
+            except Exception:
+                logger.exception("Error al purgar trabajos terminados")
+            stop_event.wait(3600)
+
+        sweeper_stop.set()
+        for thread in threads:
+            thread.join()
+
+    def run_until_empty(self) -> int:
+        """Procesar los trabajos pendientes y terminar (útil en despliegues y pruebas)"""
+        processed = 0
+        while True:
+            jobs = self.claim(self.concurrency)
+            if not jobs:
+                return processed
+            for job in jobs:
+                self.run_job(job)
+                processed += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecutar los trabajos en segundo plano")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--once", action="store_true", help="Procesar lo pendiente y salir")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    worker = JobWorker(concurrency=args.concurrency)
+    if args.once:
+        print(worker.run_until_empty())
+    else:
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            pass
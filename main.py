@@ -1,30 +1,69 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles  
-from database import engine, Base
+from middleware.compression import CompressionMiddleware
+from middleware.idempotency import IdempotencyMiddleware
+from database import engine, Base, LAST_WRITE_HEADER
 from models.user import User
-from models.diary import DiaryEntry, EmotionRecord
+from models.diary import DiaryEntry, EmotionRecord, EmotionCatalog
 from models.media import MediaFile  
+from models.token import RevokedToken
+from models.sync import SyncTombstone
+from models.job import BackgroundJob
+from models.shard import UserShard
 from routers.UserRouter import router as user_router
 from routers.DiaryRouter import router as diary_router
 from routers.MediaRouter import router as media_router  
+from services.MediaSweeper import start_background_sweeper
+from sharding import create_shard_schemas
 from config import settings
 import os
 
 
 Base.metadata.create_all(bind=engine, checkfirst=True)
+create_shard_schemas()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El sweeper lo ejecuta el worker de trabajos salvo que se pida aquí
+    sweeper_stop = start_background_sweeper() if settings.media_sweeper_in_app else None
+    yield
+    if sweeper_stop is not None:
+        sweeper_stop.set()
+
+app = FastAPI(lifespan=lifespan)
 
 app.title = "Sintiendo"
+# Añadido primero (el más interno): las respuestas repetidas siguen pasando
+# por CORS y compresión
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=tuple(settings.idempotency_paths),
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    max_entries=settings.idempotency_max_entries,
+    max_response_size=settings.idempotency_max_response_size,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.frontend_url,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El SPA lee la marca de escritura y la reenvía: la cookie SameSite=Lax
+    # no viaja en peticiones entre sitios
+    expose_headers=[LAST_WRITE_HEADER],
+)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    thread_threshold=settings.compression_thread_threshold,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    zstd_level=settings.compression_zstd_level,
+    exclude_paths=tuple(settings.compression_exclude_paths),
 )
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", StaticFiles(directory=settings.storage_local_root), name="uploads")
 @app.get("/", tags = "Home")
 def home():
     return "Sintiendo"
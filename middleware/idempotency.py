@@ -0,0 +1,214 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.utils import decode_access_token
+
+# Respuestas que no se guardan: la petición no llegó a ejecutarse o puede
+# tener éxito al reintentarla
+NOT_STORED_STATUSES = {401, 408, 429}
+
+
+class _InFlight:
+    """Marca de una petición con la misma clave que aún no ha terminado"""
+
+
+class _Fingerprint:
+    """
+    Hash SHA-256 del Content-Type y del cuerpo, calculado según se lee.
+
+    En multipart se ignora el boundary (el cliente genera uno nuevo en cada
+    reintento), tanto en la cabecera como en el cuerpo.
+    """
+
+    def __init__(self, content_type: str):
+        media_type, _, params = content_type.partition(";")
+        self.boundary = b""
+        if media_type.strip().lower().startswith("multipart/"):
+            for param in params.split(";"):
+                name, _, value = param.strip().partition("=")
+                if name.lower() == "boundary":
+                    self.boundary = b"--" + value.strip('"').encode("latin-1")
+            content_type = media_type
+        self._hash = hashlib.sha256(content_type.strip().lower().encode("latin-1") + b"\n")
+        self._tail = b""
+        self.complete = False
+
+    def feed(self, chunk: bytes, more_body: bool):
+        data = self._tail + chunk
+        if self.boundary:
+            data = data.replace(self.boundary, b"")
+            # Un boundary puede quedar partido entre dos fragmentos
+            self._tail = data[-(len(self.boundary) - 1):] if more_body else b""
+            data = data[:len(data) - len(self._tail)]
+        self._hash.update(data)
+        self.complete = not more_body
+
+    def wrap(self, receive: Receive) -> Receive:
+        async def hashing_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                self.feed(message.get("body", b""), message.get("more_body", False))
+            return message
+        return hashing_receive
+
+    async def consume(self, receive: Receive) -> bool:
+        """Leer (sin guardar) lo que quede del cuerpo; False si el cliente se desconecta"""
+        while not self.complete:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return False
+            self.feed(message.get("body", b""), message.get("more_body", False))
+        return True
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI para la cabecera `Idempotency-Key` en POST.
+
+    La primera petición con una clave se ejecuta y su respuesta se guarda
+    junto con la huella de la petición (hash del cuerpo y del Content-Type).
+    Los reintentos (mismo usuario, método, ruta y clave) con la misma huella
+    reciben la respuesta guardada con `Idempotent-Replayed: true` sin tocar
+    la base de datos ni el almacenamiento; si la huella no coincide, la
+    clave se está reutilizando para otra petición y se responde 422.
+    Mientras la primera sigue en curso se responde 409.
+
+    El almacén es del proceso, limitado a `max_entries` claves y
+    `ttl_seconds`: con varios workers, un reintento que llega a otro worker
+    se ejecuta de nuevo. La protección es completa solo con un worker o con
+    afinidad de sesión en el balanceador.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: tuple[str, ...] = (),
+        ttl_seconds: int = 86400,
+        max_entries: int = 10000,
+        max_response_size: int = 256 * 1024,
+    ):
+        self.app = app
+        self.paths = set(paths)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_response_size = max_response_size
+        self._entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _user(headers: Headers) -> Optional[str]:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        payload = decode_access_token(token)
+        return payload["sub"] if payload else None
+
+    def _get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: tuple, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        user = self._user(headers) if idempotency_key else None
+        if user is None:
+            # Sin clave o sin token válido: la petición sigue su curso normal
+            await self.app(scope, receive, send)
+            return
+
+        key = (user, scope["method"], scope["path"], idempotency_key[:255])
+        fingerprint = _Fingerprint(headers.get("content-type", ""))
+        stored = self._get(key)
+        if isinstance(stored, _InFlight):
+            response = JSONResponse(
+                {"detail": "Hay una petición en curso con esta Idempotency-Key"},
+                status_code=409,
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+        if stored is not None:
+            stored_fingerprint, status_code, response_headers, body = stored
+            if not await fingerprint.consume(receive):
+                return
+            if fingerprint.hexdigest() != stored_fingerprint:
+                response = JSONResponse(
+                    {"detail": "La Idempotency-Key ya se usó con una petición distinta"},
+                    status_code=422
+                )
+                await response(scope, receive, send)
+                return
+            await send({
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": response_headers + [(b"idempotent-replayed", b"true")]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self._put(key, _InFlight())
+        recorder = _ResponseRecorder(send, self.max_response_size)
+        stored = False
+        try:
+            await self.app(scope, fingerprint.wrap(receive), recorder)
+            response = recorder.response()
+            if response is not None and response[0] < 500 and response[0] not in NOT_STORED_STATUSES:
+                # La huella necesita el cuerpo entero aunque la app no lo leyera
+                if await fingerprint.consume(receive):
+                    self._put(key, (fingerprint.hexdigest(), *response))
+                    stored = True
+        finally:
+            if not stored:
+                self._entries.pop(key, None)
+
+
+class _ResponseRecorder:
+    """Reenvía la respuesta y conserva una copia si es pequeña y completa"""
+
+    def __init__(self, send: Send, max_size: int):
+        self.send = send
+        self.max_size = max_size
+        self.start_message: Optional[Message] = None
+        self.body = bytearray()
+        self.complete = False
+        self.overflow = False
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+        elif message["type"] == "http.response.body" and not self.overflow:
+            self.body += message.get("body", b"")
+            if len(self.body) > self.max_size:
+                self.overflow = True
+                self.body = bytearray()
+            elif not message.get("more_body", False):
+                self.complete = True
+        await self.send(message)
+
+    def response(self) -> Optional[tuple]:
+        if self.start_message is None or not self.complete:
+            return None
+        return self.start_message["status"], list(self.start_message.get("headers", [])), bytes(self.body)
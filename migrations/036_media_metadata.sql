@@ -0,0 +1,11 @@
+-- Metadatos de multimedia extraídos de las cabeceras al subir.
+-- create_all no añade columnas a tablas existentes: ejecutar una vez en Oracle.
+-- Los archivos ya subidos quedan con NULL; los clientes deben tolerarlo.
+
+ALTER TABLE SINTIENDO.media_files ADD (
+    width             NUMBER(10),
+    height            NUMBER(10),
+    duration_seconds  FLOAT,
+    sample_rate       NUMBER(10),
+    channels          NUMBER(10)
+);
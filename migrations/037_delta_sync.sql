@@ -0,0 +1,28 @@
+-- Sincronización incremental: secuencia de cambios y tombstones de borrados.
+-- create_all crea sync_tombstones pero no añade columnas a tablas existentes:
+-- ejecutar una vez en Oracle. Las filas existentes reciben un valor inicial
+-- para que un cliente con since=0 las descargue todas.
+
+CREATE SEQUENCE SINTIENDO.change_seq;
+
+ALTER TABLE SINTIENDO.diary_entries ADD (change_seq NUMBER(10));
+ALTER TABLE SINTIENDO.emotion_records ADD (change_seq NUMBER(10));
+ALTER TABLE SINTIENDO.media_files ADD (change_seq NUMBER(10));
+
+UPDATE SINTIENDO.diary_entries SET change_seq = SINTIENDO.change_seq.NEXTVAL;
+UPDATE SINTIENDO.emotion_records SET change_seq = SINTIENDO.change_seq.NEXTVAL;
+UPDATE SINTIENDO.media_files SET change_seq = SINTIENDO.change_seq.NEXTVAL;
+COMMIT;
+
+CREATE INDEX SINTIENDO.ix_diary_entries_user_seq ON SINTIENDO.diary_entries (user_id, change_seq);
+CREATE INDEX SINTIENDO.ix_emotion_records_change_seq ON SINTIENDO.emotion_records (change_seq);
+CREATE INDEX SINTIENDO.ix_media_files_user_seq ON SINTIENDO.media_files (user_id, change_seq);
+
+CREATE TABLE SINTIENDO.sync_tombstones (
+    change_seq   NUMBER(10) DEFAULT SINTIENDO.change_seq.NEXTVAL PRIMARY KEY,
+    user_id      NUMBER(10) NOT NULL,
+    entity_type  VARCHAR2(20) NOT NULL,
+    entity_id    NUMBER(10) NOT NULL
+);
+
+CREATE INDEX SINTIENDO.ix_sync_tombstones_user_seq ON SINTIENDO.sync_tombstones (user_id, change_seq);
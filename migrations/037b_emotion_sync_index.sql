@@ -0,0 +1,8 @@
+-- Sincronización incremental: las emociones no tienen user_id, así que la
+-- consulta de cambios las busca por las entradas del usuario. Un índice
+-- (diary_entry_id, change_seq) la resuelve por usuario; el índice global por
+-- change_seq obligaba a recorrer los cambios de todos. Ejecutar una vez en
+-- Oracle tras 037_delta_sync.sql.
+
+DROP INDEX SINTIENDO.ix_emotion_records_change_seq;
+CREATE INDEX SINTIENDO.ix_emotion_records_entry_seq ON SINTIENDO.emotion_records (diary_entry_id, change_seq);
@@ -0,0 +1,63 @@
+-- Catálogo de emociones: emotion_records pasa a guardar un código entero en
+-- lugar de emotion_type e icon como texto.
+--
+-- Fase de expansión: ejecutar una vez en Oracle antes de desplegar esta
+-- versión. Las columnas de texto se conservan mientras siga en marcha la
+-- anterior, que las lee y escribe; un trigger mantiene ambas
+-- representaciones en sincronía. Cuando no quede ninguna instancia de la
+-- versión anterior, ejecutar 042b_emotion_catalog_contract.sql.
+
+CREATE SEQUENCE SINTIENDO.emotion_code_seq;
+
+CREATE TABLE SINTIENDO.emotion_catalog (
+    code  NUMBER(10) DEFAULT SINTIENDO.emotion_code_seq.NEXTVAL PRIMARY KEY,
+    name  VARCHAR2(50) NOT NULL,
+    icon  VARCHAR2(100),
+    CONSTRAINT uq_emotion_catalog_name_icon UNIQUE (name, icon)
+);
+
+-- Un código por cada par (emoción, icono) ya usado
+INSERT INTO SINTIENDO.emotion_catalog (name, icon)
+SELECT DISTINCT emotion_type, icon FROM SINTIENDO.emotion_records;
+
+ALTER TABLE SINTIENDO.emotion_records ADD (emotion_code NUMBER(10));
+
+-- Escrituras de la versión anterior (solo texto): resolver o crear el código.
+-- Escrituras de esta versión (solo código): rellenar el texto para la anterior.
+CREATE OR REPLACE TRIGGER SINTIENDO.trg_emotion_records_code
+BEFORE INSERT OR UPDATE ON SINTIENDO.emotion_records
+FOR EACH ROW
+BEGIN
+    IF (INSERTING AND :NEW.emotion_code IS NULL)
+       OR (UPDATING AND (UPDATING('emotion_type') OR UPDATING('icon')) AND NOT UPDATING('emotion_code')) THEN
+        BEGIN
+            SELECT code INTO :NEW.emotion_code FROM SINTIENDO.emotion_catalog
+            WHERE name = :NEW.emotion_type
+              AND (icon = :NEW.icon OR (icon IS NULL AND :NEW.icon IS NULL));
+        EXCEPTION WHEN NO_DATA_FOUND THEN
+            BEGIN
+                INSERT INTO SINTIENDO.emotion_catalog (name, icon)
+                VALUES (:NEW.emotion_type, :NEW.icon)
+                RETURNING code INTO :NEW.emotion_code;
+            EXCEPTION WHEN DUP_VAL_ON_INDEX THEN
+                SELECT code INTO :NEW.emotion_code FROM SINTIENDO.emotion_catalog
+                WHERE name = :NEW.emotion_type
+                  AND (icon = :NEW.icon OR (icon IS NULL AND :NEW.icon IS NULL));
+            END;
+        END;
+    ELSIF INSERTING OR UPDATING('emotion_code') THEN
+        SELECT name, icon INTO :NEW.emotion_type, :NEW.icon
+        FROM SINTIENDO.emotion_catalog WHERE code = :NEW.emotion_code;
+    END IF;
+END;
+/
+
+-- Rellenar el código de las filas existentes a través del trigger (también
+-- las que la versión anterior haya escrito mientras tanto)
+UPDATE SINTIENDO.emotion_records SET emotion_type = emotion_type WHERE emotion_code IS NULL;
+COMMIT;
+
+ALTER TABLE SINTIENDO.emotion_records MODIFY (emotion_code NOT NULL);
+ALTER TABLE SINTIENDO.emotion_records ADD CONSTRAINT fk_emotion_records_code
+    FOREIGN KEY (emotion_code) REFERENCES SINTIENDO.emotion_catalog (code);
+CREATE INDEX SINTIENDO.ix_emotion_records_emotion_code ON SINTIENDO.emotion_records (emotion_code);
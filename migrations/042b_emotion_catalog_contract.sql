@@ -0,0 +1,7 @@
+-- Fase de contracción del catálogo de emociones. Ejecutar una vez en Oracle
+-- solo cuando ninguna instancia de la versión anterior siga en marcha: a
+-- partir de aquí emotion_records solo tiene el código.
+
+DROP TRIGGER SINTIENDO.trg_emotion_records_code;
+
+ALTER TABLE SINTIENDO.emotion_records DROP (emotion_type, icon);
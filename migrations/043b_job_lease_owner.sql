@@ -0,0 +1,5 @@
+-- Dueño del bloqueo de cada trabajo: el worker solo registra el resultado
+-- si sigue teniendo el trabajo reclamado. create_all no añade columnas a
+-- tablas existentes: ejecutar una vez en Oracle (y en cada shard).
+
+ALTER TABLE SINTIENDO.background_jobs ADD (locked_by VARCHAR2(100));
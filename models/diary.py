@@ -1,15 +1,20 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, DateTime, Sequence
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, DateTime, Sequence, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
+from models.sync import change_sequence
 from datetime import datetime
 
 # Secuencias para Oracle
 diary_id_seq = Sequence('diary_id_seq', schema='SINTIENDO')
 emotion_id_seq = Sequence('emotion_id_seq', schema='SINTIENDO')
+emotion_code_seq = Sequence('emotion_code_seq', schema='SINTIENDO')
 
 class DiaryEntry(Base):
     __tablename__ = "diary_entries"
-    __table_args__ = {"schema": "SINTIENDO"}
+    __table_args__ = (
+        Index("ix_diary_entries_user_seq", "user_id", "change_seq"),
+        {"schema": "SINTIENDO"}
+    )
     
     id = Column(Integer, diary_id_seq, primary_key=True, server_default=diary_id_seq.next_value())
     user_id = Column(Integer, ForeignKey('SINTIENDO.users.id'), nullable=False)
@@ -18,6 +23,8 @@ class DiaryEntry(Base):
     entry_date = Column(Date, nullable=False, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Posición en la secuencia de cambios (sincronización incremental)
+    change_seq = Column(Integer, default=change_sequence.next_value(), onupdate=change_sequence.next_value())
     
     # Relaciones usando ORM
     emotions = relationship("EmotionRecord", back_populates="diary_entry", cascade="all, delete-orphan")
@@ -38,19 +45,47 @@ class DiaryEntry(Base):
             "media_files": [media.to_dict() for media in self.media_files]
         }
 
+class EmotionCatalog(Base):
+    __tablename__ = "emotion_catalog"
+    __table_args__ = (
+        UniqueConstraint("name", "icon", name="uq_emotion_catalog_name_icon"),
+        {"schema": "SINTIENDO"}
+    )
+    
+    # Vocabulario de emociones: cada par (nombre, icono) tiene un código entero
+    code = Column(Integer, emotion_code_seq, primary_key=True, server_default=emotion_code_seq.next_value())
+    name = Column(String(50), nullable=False)
+    icon = Column(String(100))
+
 class EmotionRecord(Base):
     __tablename__ = "emotion_records"
-    __table_args__ = {"schema": "SINTIENDO"}
+    __table_args__ = (
+        # Sincronización: change_seq de las emociones de cada entrada del usuario
+        Index("ix_emotion_records_entry_seq", "diary_entry_id", "change_seq"),
+        {"schema": "SINTIENDO"}
+    )
     
     id = Column(Integer, emotion_id_seq, primary_key=True, server_default=emotion_id_seq.next_value())
     diary_entry_id = Column(Integer, ForeignKey('SINTIENDO.diary_entries.id'), nullable=False)
-    emotion_type = Column(String(50), nullable=False)
+    emotion_code = Column(Integer, ForeignKey('SINTIENDO.emotion_catalog.code'), nullable=False, index=True)
     intensity = Column(Integer, nullable=False)
-    icon = Column(String(100))
     notes = Column(Text)
+    change_seq = Column(Integer, default=change_sequence.next_value(), onupdate=change_sequence.next_value())
     
     # Relación usando ORM
     diary_entry = relationship("DiaryEntry", back_populates="emotions")
+
+    @property
+    def emotion_type(self):
+        """Nombre de la emoción, resuelto con la caché del catálogo"""
+        from services.EmotionCatalogService import emotion_catalog
+        return emotion_catalog.resolve(self.emotion_code)[0]
+
+    @property
+    def icon(self):
+        """Icono de la emoción, resuelto con la caché del catálogo"""
+        from services.EmotionCatalogService import emotion_catalog
+        return emotion_catalog.resolve(self.emotion_code)[1]
     
     def to_dict(self):
         """Convertir objeto a diccionario"""
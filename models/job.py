@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Sequence, Index
+from database import Base
+from datetime import datetime
+
+# Secuencias para Oracle
+job_id_seq = Sequence('job_id_seq', schema='SINTIENDO')
+
+# Estados de un trabajo
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index("ix_background_jobs_status_run_at", "status", "run_at"),
+        {"schema": "SINTIENDO"}
+    )
+
+    id = Column(Integer, job_id_seq, primary_key=True, server_default=job_id_seq.next_value())
+    job_type = Column(String(100), nullable=False)
+    payload = Column(Text)  # JSON
+    status = Column(String(20), nullable=False, default=JOB_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime)
+    locked_by = Column(String(100))  # Reclamación vigente (worker y token)
+    last_error = Column(String(2000))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+class MaintenanceLease(Base):
+    __tablename__ = "maintenance_leases"
+    __table_args__ = {"schema": "SINTIENDO"}
+
+    # Tareas periódicas que solo debe ejecutar un proceso a la vez
+    name = Column(String(100), primary_key=True)
+    locked_by = Column(String(100))
+    locked_until = Column(DateTime)
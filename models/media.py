@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Sequence
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Sequence, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
+from models.sync import change_sequence
 from datetime import datetime
 
 # Secuencias para Oracle
@@ -8,7 +9,10 @@ media_id_seq = Sequence('media_id_seq', schema='SINTIENDO')
 
 class MediaFile(Base):
     __tablename__ = "media_files"
-    __table_args__ = {"schema": "SINTIENDO"}
+    __table_args__ = (
+        Index("ix_media_files_user_seq", "user_id", "change_seq"),
+        {"schema": "SINTIENDO"}
+    )
     
     id = Column(Integer, media_id_seq, primary_key=True, server_default=media_id_seq.next_value())
     diary_entry_id = Column(Integer, ForeignKey('SINTIENDO.diary_entries.id'), nullable=False)
@@ -21,6 +25,16 @@ class MediaFile(Base):
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Metadatos leídos de las cabeceras al subir el archivo
+    width = Column(Integer)
+    height = Column(Integer)
+    duration_seconds = Column(Float)
+    sample_rate = Column(Integer)
+    channels = Column(Integer)
+    
+    # Posición en la secuencia de cambios (sincronización incremental)
+    change_seq = Column(Integer, default=change_sequence.next_value(), onupdate=change_sequence.next_value())
+    
     # Relaciones usando ORM
     diary_entry = relationship("DiaryEntry", back_populates="media_files")
     user = relationship("User")
@@ -43,5 +57,10 @@ class MediaFile(Base):
             "file_size": self.file_size,
             "description": self.description,
             "created_at": self.created_at,
+            "width": self.width,
+            "height": self.height,
+            "duration_seconds": self.duration_seconds,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
             "download_url": self.download_url
             }
\ No newline at end of file
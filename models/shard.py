@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from database import Base
+
+class UserShard(Base):
+    __tablename__ = "user_shards"
+    __table_args__ = {"schema": "SINTIENDO"}
+
+    # Estado de los datos de un usuario entre shards (vive en el primario)
+    user_id = Column(Integer, ForeignKey('SINTIENDO.users.id'), primary_key=True)
+    # Nombre del shard (clave de shard_urls, o "primary") que tiene sus datos
+    shard = Column(String(50), nullable=False)
+    # Se incrementa al moverlo: invalida los cursores de sincronización anteriores
+    epoch = Column(Integer, nullable=False, default=0)
+    # Mientras se mueve, sus peticiones se rechazan para que no escriban en el origen
+    moving_since = Column(DateTime)
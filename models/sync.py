@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Sequence, Index
+from database import Base
+
+# Secuencia global de cambios: cada alta, modificación o borrado toma el
+# siguiente valor y los clientes sincronizan a partir del último que vieron
+change_sequence = Sequence('change_seq', schema='SINTIENDO')
+
+class SyncClock(Base):
+    __tablename__ = "sync_clocks"
+    __table_args__ = {"schema": "SINTIENDO"}
+
+    # Una fila por usuario: las transacciones que escriben sus datos la
+    # bloquean antes de tomar valores de change_seq y hasta el commit
+    user_id = Column(Integer, primary_key=True)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_seq", "user_id", "change_seq"),
+        {"schema": "SINTIENDO"}
+    )
+
+    # Registro de un borrado: entrada, emoción o archivo multimedia
+    change_seq = Column(Integer, change_sequence, primary_key=True, server_default=change_sequence.next_value())
+    user_id = Column(Integer, nullable=False)
+    entity_type = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime
+from database import Base
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    __table_args__ = {"schema": "SINTIENDO"}
+
+    # jti de un refresh token usado o id de una familia de tokens revocada
+    token_id = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
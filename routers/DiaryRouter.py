@@ -1,22 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_read_db
 from schemas.DiarySchema import (
-    DiaryEntryCreate, DiaryEntryResponse, DiaryEntryUpdate,
-    EmotionCreate, EmotionResponse, EmotionUpdate, EmotionSummaryResponse
+    DiaryEntryCreate, DiaryEntryResponse, DiaryEntryPartialResponse, DiaryEntryUpdate,
+    EmotionCreate, EmotionResponse, EmotionUpdate, EmotionSummaryResponse,
+    EmotionTrendsResponse, CalendarResponse, SyncChangesResponse
 )
 from services.DiaryService import DiaryService
-from services.UsersService import get_current_user
+from services.SyncService import SyncService
+from services.UsersService import get_current_user, get_user_db, get_user_read_db
+from events import get_broker
+from config import settings
 from models.user import User
 from datetime import date
-from typing import List, Dict
+from typing import List, Dict, Literal, Optional, Tuple
 
 router = APIRouter(prefix="/diary", tags=["diary"])
 
+def entry_projection(
+    fields: Optional[str] = Query(None, description="Columnas separadas por comas, p. ej. id,title,entry_date"),
+    include: Optional[str] = Query(None, description="Relaciones separadas por comas: emotions, media_files")
+) -> Optional[Tuple[tuple, tuple]]:
+    """Proyección pedida por el cliente; sin parámetros, la entrada completa"""
+    try:
+        return DiaryService.parse_projection(fields, include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def project_entry(entry, projection: Optional[Tuple[tuple, tuple]]):
+    """Serializar solo lo cargado, sin disparar cargas diferidas"""
+    if projection is None:
+        return DiaryEntryResponse.from_orm(entry)
+    fields, relations = projection
+    return DiaryEntryPartialResponse.model_validate(
+        {name: getattr(entry, name) for name in fields + relations},
+        from_attributes=True
+    )
+
 @router.post("/entries", response_model=DiaryEntryResponse)
 def create_entry(
     diary_data: DiaryEntryCreate, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Crear nueva entrada de diario con emociones"""
@@ -26,55 +53,61 @@ def create_entry(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/entries", response_model=List[DiaryEntryResponse])
+@router.get("/entries", response_model=List[DiaryEntryPartialResponse], response_model_exclude_unset=True)
 def read_entries(
     skip: int = 0, 
     limit: int = 100, 
     emotion_type: str = None,
-    db: Session = Depends(get_db),
+    projection: Optional[Tuple[tuple, tuple]] = Depends(entry_projection),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtener entradas de diario, opcionalmente filtradas por emoción"""
+    """Obtener entradas de diario, opcionalmente filtradas por emoción y proyectadas con fields/include"""
     if emotion_type:
-        entries = DiaryService.get_entries_with_emotions(db, current_user.id, emotion_type)
+        entries = DiaryService.get_entries_with_emotions(db, current_user.id, emotion_type, projection)
     else:
-        entries = DiaryService.get_diary_entries(db, current_user.id, skip, limit)
+        entries = DiaryService.get_diary_entries(db, current_user.id, skip, limit, projection)
     
-    return [DiaryEntryResponse.from_orm(entry) for entry in entries]
+    return [project_entry(entry, projection) for entry in entries]
 
-@router.get("/entries/{entry_id}", response_model=DiaryEntryResponse)
+@router.get("/entries/{entry_id}", response_model=DiaryEntryPartialResponse, response_model_exclude_unset=True)
 def read_entry(
     entry_id: int, 
-    db: Session = Depends(get_db),
+    projection: Optional[Tuple[tuple, tuple]] = Depends(entry_projection),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener entrada específica del diario"""
-    entry = DiaryService.get_diary_entry_by_id(db, current_user.id, entry_id)
+    entry = DiaryService.get_diary_entry_by_id(db, current_user.id, entry_id, projection)
     if not entry:
         raise HTTPException(status_code=404, detail="Entrada no encontrada")
-    return DiaryEntryResponse.from_orm(entry)
+    return project_entry(entry, projection)
 
-@router.get("/entries/date/{entry_date}", response_model=DiaryEntryResponse)
+@router.get("/entries/date/{entry_date}", response_model=DiaryEntryPartialResponse, response_model_exclude_unset=True)
 def read_entry_by_date(
     entry_date: date, 
-    db: Session = Depends(get_db),
+    projection: Optional[Tuple[tuple, tuple]] = Depends(entry_projection),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener entrada por fecha"""
-    entry = DiaryService.get_diary_entry_by_date(db, current_user.id, entry_date)
+    entry = DiaryService.get_diary_entry_by_date(db, current_user.id, entry_date, projection)
     if not entry:
         raise HTTPException(status_code=404, detail="No hay entrada para esta fecha")
-    return DiaryEntryResponse.from_orm(entry)
+    return project_entry(entry, projection)
 
 @router.put("/entries/{entry_id}", response_model=DiaryEntryResponse)
 def update_entry(
     entry_id: int, 
     diary_data: DiaryEntryUpdate, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Actualizar entrada del diario"""
-    entry = DiaryService.update_diary_entry(db, current_user.id, entry_id, diary_data)
+    try:
+        entry = DiaryService.update_diary_entry(db, current_user.id, entry_id, diary_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not entry:
         raise HTTPException(status_code=404, detail="Entrada no encontrada")
     return DiaryEntryResponse.from_orm(entry)
@@ -82,7 +115,7 @@ def update_entry(
 @router.delete("/entries/{entry_id}")
 def delete_entry(
     entry_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Eliminar entrada del diario"""
@@ -95,7 +128,7 @@ def delete_entry(
 def add_emotion(
     entry_id: int,
     emotion_data: EmotionCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Añadir emoción a una entrada existente"""
@@ -106,7 +139,7 @@ def add_emotion(
 def update_emotion(
     emotion_id: int,
     emotion_data: EmotionUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Actualizar emoción existente"""
@@ -118,7 +151,7 @@ def update_emotion(
 @router.delete("/emotions/{emotion_id}")
 def delete_emotion(
     emotion_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Eliminar emoción"""
@@ -131,19 +164,92 @@ def delete_emotion(
 def get_emotions_summary(
     start_date: date, 
     end_date: date, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener resumen estadístico de emociones"""
     summary = DiaryService.get_emotion_summary(db, current_user.id, start_date, end_date)
     return summary
 
+@router.get("/emotion-trends", response_model=EmotionTrendsResponse)
+def get_emotions_trends(
+    start_date: date,
+    end_date: date,
+    granularity: Literal["day", "week", "month"] = "day",
+    window: int = Query(7, ge=1, le=365),
+    db: Session = Depends(get_user_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Obtener tendencias de emociones por día, semana o mes con media móvil"""
+    try:
+        return DiaryService.get_emotion_trends(
+            db, current_user.id, start_date, end_date, granularity, window
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/calendar", response_model=CalendarResponse)
+def get_calendar(
+    year: int = Query(..., ge=1900, le=9999),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    db: Session = Depends(get_user_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Obtener días con entrada y emoción dominante de un mes o año"""
+    return DiaryService.get_calendar(db, current_user.id, year, month)
+
+@router.get("/changes", response_model=SyncChangesResponse)
+def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_user_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Obtener entradas, emociones y multimedia creadas, modificadas o borradas desde el cursor"""
+    return SyncService.get_changes(db, current_user.id, since, limit)
+
 @router.get("/recent-emotions", response_model=List[EmotionResponse])
 def get_recent_emotions(
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener emociones recientes"""
     emotions = DiaryService.get_recent_emotions(db, current_user.id, limit)
-    return [EmotionResponse.from_orm(emotion) for emotion in emotions]
\ No newline at end of file
+    return [EmotionResponse.from_orm(emotion) for emotion in emotions]
+
+@router.get("/events")
+def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None, description="Token JWT para clientes EventSource sin cabeceras"),
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db)
+):
+    """Recibir por Server-Sent Events los cambios de entradas y emociones del usuario"""
+    scheme, _, header_token = request.headers.get("authorization", "").partition(" ")
+    token = token or (header_token if scheme.lower() == "bearer" else None)
+    if not token:
+        raise HTTPException(status_code=401, detail="No autenticado", headers={"WWW-Authenticate": "Bearer"})
+    user_id = get_current_user(token, db, primary_db).id
+    # La conexión a la base de datos no se mantiene durante el stream
+    db.close()
+    primary_db.close()
+
+    async def event_stream():
+        broker = get_broker()
+        async with broker.subscribe(user_id) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
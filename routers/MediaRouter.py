@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+import mimetypes
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database import get_db
-from schemas.MediaSchema import MediaResponse, DrawingData
+from schemas.MediaSchema import MediaResponse, DrawingData, UploadSessionCreate, UploadSessionResponse
 from services.MediaService import MediaService
-from services.UsersService import get_current_user
+from services.UploadSessionService import UploadSessionService
+from services.UsersService import get_current_user, get_user_db, get_user_read_db
 from models.user import User
+from storage import get_storage
 from typing import List, Optional
 
 router = APIRouter(prefix="/media", tags=["media"])
@@ -14,7 +18,7 @@ async def upload_audio(
     diary_entry_id: int = Form(...),
     description: Optional[str] = Form(None),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Subir archivo de audio usando ORM"""
@@ -32,7 +36,7 @@ async def upload_audio(
 @router.post("/upload/drawing", response_model=MediaResponse)
 async def upload_drawing(
     drawing_data: DrawingData,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_db),
     current_user: User = Depends(get_current_user)
 ):
     """Guardar dibujo usando ORM"""
@@ -44,10 +48,70 @@ async def upload_drawing(
     
     return MediaResponse(**media_file.to_dict())
 
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload(
+    upload: UploadSessionCreate,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Iniciar una subida reanudable de audio"""
+    return UploadSessionService.create_session(
+        db, current_user.id, upload.diary_entry_id, upload.filename,
+        upload.content_type, upload.total_size, upload.description
+    )
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """Consultar el offset desde el que continuar una subida"""
+    upload = await UploadSessionService.get_status(upload_id, current_user.id)
+    response.headers["Upload-Offset"] = str(upload["offset"])
+    return upload
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Enviar un bloque (cuerpo binario) a partir de la cabecera Upload-Offset"""
+    # Devolver la conexión al pool mientras se recibe el cuerpo
+    db.close()
+    upload = await UploadSessionService.append_chunk(
+        upload_id, current_user.id, upload_offset, request.stream()
+    )
+    response.headers["Upload-Offset"] = str(upload["offset"])
+    return upload
+
+@router.post("/uploads/{upload_id}/finalize", response_model=MediaResponse)
+async def finalize_upload(
+    upload_id: str,
+    db: Session = Depends(get_user_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Completar la subida y crear el registro multimedia"""
+    media_file = await UploadSessionService.finalize(db, upload_id, current_user.id)
+    return MediaResponse(**media_file.to_dict())
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancelar una subida reanudable"""
+    await UploadSessionService.cancel(upload_id, current_user.id)
+    return {"message": "Subida cancelada"}
+
 @router.get("/entry/{diary_entry_id}", response_model=List[MediaResponse])
 def get_entry_media(
     diary_entry_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener multimedia de entrada usando ORM"""
@@ -57,7 +121,7 @@ def get_entry_media(
 @router.get("/{media_id}")
 def get_media_info(
     media_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_user_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener información de archivo multimedia usando ORM"""
@@ -65,4 +129,59 @@ def get_media_info(
     if not media_file:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
     
-    return MediaResponse(**media_file.to_dict())
\ No newline at end of file
+    return MediaResponse(**media_file.to_dict())
+
+def _parse_range(range_header: str, size: int):
+    """Interpretar un único rango `bytes=inicio-fin`; None si no aplica"""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Sufijo: los últimos N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Rango no satisfacible",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+@router.get("/{media_id}/download")
+async def download_media(
+    media_id: int,
+    request: Request,
+    db: Session = Depends(get_user_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Descargar archivo multimedia con soporte de rangos (Range)"""
+    media_file = MediaService.get_media_file(db, current_user.id, media_id)
+    storage = get_storage()
+    key = storage.key_for(media_file.file_path)
+    stored_object = await storage.stat(key)
+    if stored_object is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    media_type = mimetypes.guess_type(media_file.filename)[0] or "application/octet-stream"
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = _parse_range(request.headers.get("range"), stored_object.size)
+    if byte_range is None:
+        headers["Content-Length"] = str(stored_object.size)
+        return StreamingResponse(storage.get_stream(key), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stored_object.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        storage.get_stream(key, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import hmac
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from database import get_db
-from schemas.UsersSchema import UserCreate, UserResponse, LoginRequest, TokenResponse
-from services.UsersService import create_user, login_user
+from schemas.UsersSchema import UserCreate, UserResponse, LoginRequest, TokenResponse, RefreshRequest
+from services.UsersService import create_user, login_user, refresh_session, logout_user
+from security.throttling import auth_admission, client_ip, AdmissionRejected
+from config import settings
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -21,33 +26,90 @@ def http_error(code:int, message:str, detail:str=None):
     )
 
 
-@router.post("/signup", response_model=UserResponse)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+@contextmanager
+def admission_guard(request: Request, email: str):
+    """
+    Aplica el control de admisión y responde 429 con Retry-After si se rechaza
+    """
     try:
-        return create_user(
-            db=db,
-            username=user.username,
-            email=user.email,
-            password=user.password,
-            role=user.role
+        peer = request.client.host if request.client else "unknown"
+        ip = client_ip(peer, request.headers.get("x-forwarded-for"))
+        with auth_admission.admit(ip, email):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "status": status.HTTP_429_TOO_MANY_REQUESTS,
+                "message": "Demasiadas solicitudes",
+                "detail": e.reason
+            },
+            headers={"Retry-After": str(e.retry_after)}
         )
-    except ValueError as e:
-        http_error(400, "Error de validación", str(e))
-    except Exception as e:
-        http_error(500, "Error interno del servidor", str(e))
+
+
+@router.post("/signup", response_model=UserResponse)
+def signup(user: UserCreate, request: Request, db: Session = Depends(get_db)):
+    with admission_guard(request, user.email):
+        try:
+            return create_user(
+                db=db,
+                username=user.username,
+                email=user.email,
+                password=user.password,
+                role=user.role
+            )
+        except ValueError as e:
+            http_error(400, "Error de validación", str(e))
+        except Exception as e:
+            http_error(500, "Error interno del servidor", str(e))
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: LoginRequest, db: Session = Depends(get_db)):
-    try:
-        data_response, error = login_user(db, user_data.email, user_data.password)
+def login(user_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
+    with admission_guard(request, user_data.email):
+        try:
+            data_response, error = login_user(db, user_data.email, user_data.password)
         
-        if error:
-            http_error(status.HTTP_401_UNAUTHORIZED, "Credenciales inválidas", error)
+            if error:
+                http_error(status.HTTP_401_UNAUTHORIZED, "Credenciales inválidas", error)
+
+            return data_response
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            http_error(500, "Error interno del servidor", str(e))
+
+
+@router.post("/refresh", response_model=TokenResponse)
+def refresh(data: RefreshRequest, db: Session = Depends(get_db)):
+    data_response, error = refresh_session(db, data.refresh_token)
+    if error:
+        http_error(status.HTTP_401_UNAUTHORIZED, "Sesión inválida", error)
+    return data_response
+
+
+@router.post("/logout")
+def logout(data: RefreshRequest, db: Session = Depends(get_db)):
+    error = logout_user(db, data.refresh_token)
+    if error:
+        http_error(status.HTTP_401_UNAUTHORIZED, "Sesión inválida", error)
+    return {"message": "Sesión cerrada correctamente"}
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Endpoints de operación: exigen la cabecera X-Admin-Token con
+    `admission_stats_token`. Sin token configurado no existen (404).
+    """
+    if not settings.admission_stats_token:
+        http_error(status.HTTP_404_NOT_FOUND, "No encontrado")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.admission_stats_token.encode()):
+        http_error(status.HTTP_401_UNAUTHORIZED, "No autorizado", "X-Admin-Token inválido")
 
-        return data_response
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        http_error(500, "Error interno del servidor", str(e))
+@router.get("/admission-stats", dependencies=[Depends(require_admin_token)])
+def admission_stats():
+    """Contadores del control de admisión para monitorización"""
+    return auth_admission.stats()
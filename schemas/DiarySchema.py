@@ -1,6 +1,6 @@
 from pydantic import BaseModel, validator
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from schemas.MediaSchema import MediaResponse
 
 class EmotionCreate(BaseModel):
@@ -46,6 +46,18 @@ class DiaryEntryResponse(BaseModel):
     class Config:
         from_attributes = True 
 
+class DiaryEntryPartialResponse(BaseModel):
+    """Entrada con solo los campos pedidos en fields= / include="""
+    id: int
+    user_id: Optional[int] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    entry_date: Optional[date] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    emotions: Optional[List[EmotionResponse]] = None
+    media_files: Optional[List[MediaResponse]] = None
+
 class DiaryEntryUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -70,4 +82,48 @@ class EmotionSummaryResponse(BaseModel):
     average_intensity: float
     total_intensity: int
     icon: Optional[str] = None
-    
\ No newline at end of file
+
+class EmotionTrendPoint(BaseModel):
+    bucket: date
+    count: int
+    average_intensity: float
+    moving_average_intensity: float
+
+class EmotionTrendsResponse(BaseModel):
+    granularity: str
+    window: int
+    series: Dict[str, List[EmotionTrendPoint]] = {}
+
+class CalendarResponse(BaseModel):
+    start_date: date
+    days: int
+    occupancy: str  # Bitset base64: bit i (LSB primero) = start_date + i días
+    emotions: List[str] = []  # Leyenda de códigos de emoción
+    codes: List[int] = []  # Un código por día ocupado; 0 = sin emoción
+
+class DiaryEntrySyncResponse(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    content: str
+    entry_date: date
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class SyncTombstoneResponse(BaseModel):
+    entity_type: str  # entry, emotion o media
+    entity_id: int
+    
+    class Config:
+        from_attributes = True
+
+class SyncChangesResponse(BaseModel):
+    cursor: int  # Opaco: enviar como `since` en la siguiente llamada
+    has_more: bool
+    entries: List[DiaryEntrySyncResponse] = []
+    emotions: List[EmotionResponse] = []
+    media_files: List[MediaResponse] = []
+    deleted: List[SyncTombstoneResponse] = []
@@ -17,6 +17,11 @@ class MediaResponse(BaseModel):
     file_size: Optional[int]
     description: Optional[str]
     created_at: datetime
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration_seconds: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
     download_url: str  # URL para descargar el archivo
     
     class Config:
@@ -25,4 +30,17 @@ class MediaResponse(BaseModel):
 class DrawingData(BaseModel):
     diary_entry_id: int
     drawing_data: str  # Base64 encoded image data
-    description: Optional[str] = None
\ No newline at end of file
+    description: Optional[str] = None
+
+class UploadSessionCreate(BaseModel):
+    diary_entry_id: int
+    filename: str
+    content_type: str
+    total_size: int  # Tamaño total en bytes
+    description: Optional[str] = None
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    offset: int  # Bytes recibidos: siguiente PATCH desde aquí
+    total_size: int
+    expires_at: float  # Timestamp Unix
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, field_validator
-from typing import Literal
+from typing import Literal, Optional
 
 
 # ---------- CREATE ----------
@@ -39,3 +39,9 @@ class TokenResponse(BaseModel):
     username: str 
     email: str
     role: str         # <<< agregado
+    refresh_token: Optional[str] = None
+
+
+# ---------- REFRESH ----------
+class RefreshRequest(BaseModel):
+    refresh_token: str
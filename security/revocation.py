@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models.token import RevokedToken
+from config import settings
+
+
+class RevocationStore:
+    """
+    Revocación de refresh tokens respaldada por la tabla `revoked_tokens`.
+
+    La tabla es la única fuente de verdad: cada consulta sin respuesta local
+    se confirma con una búsqueda por clave primaria, así que una revocación
+    hecha en otro worker se respeta de inmediato. Una revocación no se deshace
+    hasta que caduca, por lo que los positivos ya confirmados se guardan en
+    memoria (como máximo `capacity`) y no vuelven a consultarse. Los expirados
+    se purgan cada `purge_seconds` con una sesión propia.
+    """
+
+    def __init__(self, capacity: int = 100000, purge_seconds: int = 3600):
+        self.capacity = capacity
+        self.purge_seconds = purge_seconds
+        self._confirmed: OrderedDict = OrderedDict()
+        self._purged_at = None
+        self._lock = threading.Lock()
+
+    def _remember(self, token_id: str, expires_at: datetime):
+        with self._lock:
+            self._confirmed[token_id] = expires_at
+            self._confirmed.move_to_end(token_id)
+            while len(self._confirmed) > self.capacity:
+                self._confirmed.popitem(last=False)
+
+    def _purge_expired(self, db: Session):
+        now = time.monotonic()
+        with self._lock:
+            if self._purged_at is not None and now - self._purged_at < self.purge_seconds:
+                return
+            self._purged_at = now
+        # Un token caducado ya falla la validación de exp
+        with Session(bind=db.get_bind()) as purge_db:
+            purge_db.query(RevokedToken).filter(
+                RevokedToken.expires_at < datetime.utcnow()
+            ).delete(synchronize_session=False)
+            purge_db.commit()
+
+    def is_revoked(self, db: Session, token_id: str) -> bool:
+        """Comprobar si un jti o una familia está revocada"""
+        self._purge_expired(db)
+        if token_id in self._confirmed:
+            return True
+        revoked = db.get(RevokedToken, token_id)
+        if revoked is None:
+            return False
+        self._remember(token_id, revoked.expires_at)
+        return True
+
+    def revoke(self, db: Session, token_id: str, expires_at: datetime) -> bool:
+        """
+        Revocar un id; devuelve False si ya estaba revocado (reutilización)
+        """
+        db.add(RevokedToken(token_id=token_id, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        self._remember(token_id, expires_at)
+        return True
+
+
+revocation_store = RevocationStore(purge_seconds=settings.revocation_purge_seconds)
@@ -0,0 +1,151 @@
+import ipaddress
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from config import settings
+
+
+class AdmissionRejected(Exception):
+    """Petición rechazada por el control de admisión"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+_trusted_networks = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies]
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks)
+
+
+def client_ip(peer: str, forwarded_for: str = None) -> str:
+    """
+    IP del cliente para los límites por IP.
+
+    Solo si la conexión viene de un proxy de `trusted_proxies` se recorre
+    X-Forwarded-For de derecha a izquierda, saltando los proxies de
+    confianza: la primera dirección restante es la que vio el último de
+    ellos. Lo que haya más a la izquierda lo pone el cliente y no se usa.
+    """
+    if not forwarded_for or not _is_trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimiter:
+    """
+    Token buckets por clave (IP, email...) con un número máximo de claves.
+
+    Las claves menos usadas recientemente se descartan al superar `max_keys`,
+    así un ataque con muchas IPs no hace crecer la memoria sin límite.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> tuple[bool, float]:
+        """Consumir un token; devuelve (permitido, segundos hasta el siguiente token)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, wait = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, wait = False, (1 - tokens) / self.rate
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+
+class AdmissionController:
+    """
+    Control de admisión para endpoints que ejecutan bcrypt.
+
+    Limita la tasa por IP y por email y fija un máximo global de operaciones
+    bcrypt concurrentes; cuando no hay hueco se rechaza al instante con 429
+    en lugar de encolar, para que el resto de endpoints conserve CPU.
+    """
+
+    def __init__(self, ip_limiter: RateLimiter, email_limiter: RateLimiter, max_concurrent: int):
+        self.ip_limiter = ip_limiter
+        self.email_limiter = email_limiter
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._in_flight = 0
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        max_concurrent = settings.auth_max_concurrent_hashes or max(1, (os.cpu_count() or 2) // 2)
+        return cls(
+            RateLimiter(settings.auth_ip_rate_per_minute, settings.auth_ip_burst),
+            RateLimiter(settings.auth_email_rate_per_minute, settings.auth_email_burst),
+            max_concurrent
+        )
+
+    def _reject(self, reason: str, retry_after: float):
+        with self._lock:
+            self._counters[f"rejected_{reason}"] += 1
+        raise AdmissionRejected(reason, max(1, int(retry_after + 0.999)))
+
+    @contextmanager
+    def admit(self, ip: str, email: str):
+        """Reservar un hueco de bcrypt si la IP y el email tienen tokens disponibles"""
+        allowed, wait = self.ip_limiter.allow(ip)
+        if not allowed:
+            self._reject("ip", wait)
+
+        allowed, wait = self.email_limiter.allow(email.strip().lower())
+        if not allowed:
+            self._reject("email", wait)
+
+        if not self._slots.acquire(blocking=False):
+            self._reject("busy", 1)
+
+        with self._lock:
+            self._counters["admitted"] += 1
+            self._in_flight += 1
+            self._counters["peak_in_flight"] = max(self._counters["peak_in_flight"], self._in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Contadores para monitorización"""
+        with self._lock:
+            return {
+                "admitted": self._counters["admitted"],
+                "rejected_ip": self._counters["rejected_ip"],
+                "rejected_email": self._counters["rejected_email"],
+                "rejected_busy": self._counters["rejected_busy"],
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._counters["peak_in_flight"],
+                "max_concurrent": self.max_concurrent
+            }
+
+
+auth_admission = AdmissionController.from_settings()
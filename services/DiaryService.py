@@ -1,19 +1,56 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_
-from models.diary import DiaryEntry, EmotionRecord
+import base64
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import Date, func, and_, extract, literal_column, select, insert, update
+from models.diary import DiaryEntry, EmotionRecord, EmotionCatalog
 from models.media import MediaFile
-from schemas.DiarySchema import DiaryEntryCreate, DiaryEntryUpdate, EmotionCreate
+from services.EmotionCatalogService import emotion_catalog
+from jobs import enqueue_many
+from jobs.handlers import DELETE_MEDIA_FILE
+from services.SyncService import SyncService, ENTITY_ENTRY, ENTITY_EMOTION, ENTITY_MEDIA
+from schemas.DiarySchema import DiaryEntryCreate, DiaryEntryUpdate, EmotionCreate, EmotionResponse
+from events import queue_event
 from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi import HTTPException, status
 
+# Formatos de TRUNC de Oracle para cada granularidad de tendencias
+TREND_GRANULARITIES = {
+    "day": "DD",
+    "week": "IW",
+    "month": "MM"
+}
+
+# Columnas y relaciones que se pueden pedir con fields= / include=
+ENTRY_FIELDS = ("id", "user_id", "title", "content", "entry_date", "created_at", "updated_at")
+ENTRY_RELATIONS = ("emotions", "media_files")
+
+# Eventos publicados a los clientes SSE tras el commit
+ENTRY_CREATED = "entry.created"
+ENTRY_UPDATED = "entry.updated"
+ENTRY_DELETED = "entry.deleted"
+EMOTION_CREATED = "emotion.created"
+EMOTION_UPDATED = "emotion.updated"
+EMOTION_DELETED = "emotion.deleted"
+
+
+def _entry_event(entry: DiaryEntry) -> dict:
+    # Sin el contenido: el cliente lo pide si lo necesita
+    return {"id": entry.id, "title": entry.title, "entry_date": entry.entry_date.isoformat()}
+
+
+def _emotion_event(emotion: EmotionRecord) -> dict:
+    return EmotionResponse.model_validate(emotion).model_dump(mode="json")
+
+
 class DiaryService:
     
     @staticmethod
     def create_diary_entry(db: Session, user_id: int, diary_data: DiaryEntryCreate) -> DiaryEntry:
         """Crear entrada de diario con emociones usando ORM"""
+        SyncService.lock_changes(db, user_id)
         # Verificar si ya existe una entrada para esta fecha
-        existing_entry = db.query(DiaryEntry).filter(
+        existing_entry = db.query(DiaryEntry.id).filter(
             DiaryEntry.user_id == user_id,
             func.TRUNC(DiaryEntry.entry_date) == diary_data.entry_date
         ).first()
@@ -21,159 +58,286 @@ class DiaryService:
         if existing_entry:
             raise ValueError("Ya existe una entrada para esta fecha")
         
-        # Crear la entrada del diario usando ORM
-        diary_entry = DiaryEntry(
-            user_id=user_id,
-            title=diary_data.title,
-            content=diary_data.content,
-            entry_date=diary_data.entry_date
-        )
+        # Códigos antes de escribir: las altas en el catálogo (y su copia en
+        # el shard) van en otra transacción
+        emotion_codes = [
+            emotion_catalog.code_for(db, emotion_data.emotion_type, emotion_data.icon)
+            for emotion_data in diary_data.emotions or []
+        ]
         
-        db.add(diary_entry)
-        db.flush()  # Flush para obtener el ID sin commit
+        # INSERT ... RETURNING: el id de la secuencia vuelve en el mismo viaje
+        diary_entry = db.scalars(
+            insert(DiaryEntry).values(
+                user_id=user_id,
+                title=diary_data.title,
+                content=diary_data.content,
+                entry_date=diary_data.entry_date
+            ).returning(DiaryEntry)
+        ).one()
         
-        # Crear registros de emociones usando ORM
-        for emotion_data in diary_data.emotions:
-            emotion = EmotionRecord(
-                diary_entry_id=diary_entry.id,
-                emotion_type=emotion_data.emotion_type,
-                intensity=emotion_data.intensity,
-                icon=emotion_data.icon,
-                notes=emotion_data.notes
-            )
-            db.add(emotion)
+        # Todas las emociones en un único INSERT con RETURNING
+        emotions = []
+        if diary_data.emotions:
+            emotions = db.scalars(
+                insert(EmotionRecord).returning(EmotionRecord, sort_by_parameter_order=True),
+                [
+                    {
+                        "diary_entry_id": diary_entry.id,
+                        "emotion_code": emotion_code,
+                        "intensity": emotion_data.intensity,
+                        "notes": emotion_data.notes
+                    }
+                    for emotion_data, emotion_code in zip(diary_data.emotions, emotion_codes)
+                ]
+            ).all()
         
+        # Las relaciones se conocen: evitar cargas perezosas al serializar
+        set_committed_value(diary_entry, "emotions", list(emotions))
+        set_committed_value(diary_entry, "media_files", [])
+        
+        queue_event(db, user_id, ENTRY_CREATED, _entry_event(diary_entry))
+        for emotion in emotions:
+            queue_event(db, user_id, EMOTION_CREATED, _emotion_event(emotion))
         db.commit()
-        db.refresh(diary_entry)
         return diary_entry
 
     @staticmethod
-    def get_diary_entries(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[DiaryEntry]:
+    def parse_projection(fields: Optional[str], include: Optional[str]) -> Optional[Tuple[tuple, tuple]]:
+        """
+        Interpretar los parámetros `fields` e `include` (listas separadas por comas).
+
+        Devuelve None si no se pidió proyección (respuesta completa). Si solo
+        llega `include`, se devuelven todas las columnas; si solo llega
+        `fields`, ninguna relación.
+        """
+        if fields is None and include is None:
+            return None
+
+        requested_fields = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else ENTRY_FIELDS
+        requested_relations = tuple(r.strip() for r in include.split(",") if r.strip()) if include else ()
+
+        unknown = [f for f in requested_fields if f not in ENTRY_FIELDS]
+        unknown += [r for r in requested_relations if r not in ENTRY_RELATIONS]
+        if unknown:
+            raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+
+        # El id siempre se devuelve para poder identificar la entrada
+        if "id" not in requested_fields:
+            requested_fields = ("id",) + requested_fields
+        return requested_fields, requested_relations
+
+    @staticmethod
+    def entry_load_options(projection: Optional[Tuple[tuple, tuple]] = None) -> list:
+        """
+        Opciones de carga para una proyección de parse_projection.
+
+        Sin proyección se mantienen las relaciones con joinedload. Con ella,
+        load_only evita leer columnas no pedidas (el CLOB `content` no viaja
+        si no se pide) y las relaciones se cargan con selectinload, que no
+        repite las columnas de la entrada por cada emoción o archivo.
+        """
+        if projection is None:
+            return [joinedload(DiaryEntry.emotions), joinedload(DiaryEntry.media_files)]
+
+        fields, relations = projection
+        options = [load_only(*(getattr(DiaryEntry, field) for field in fields))]
+        options += [selectinload(getattr(DiaryEntry, relation)) for relation in relations]
+        return options
+
+    @staticmethod
+    def get_diary_entries(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                          projection: Optional[Tuple[tuple, tuple]] = None) -> List[DiaryEntry]:
         """Obtener entradas de diario con relaciones usando ORM"""
         return db.query(DiaryEntry).filter(
             DiaryEntry.user_id == user_id
         ).options(
-            joinedload(DiaryEntry.emotions),
-            joinedload(DiaryEntry.media_files)
+            *DiaryService.entry_load_options(projection)
         ).order_by(
             DiaryEntry.entry_date.desc()
         ).offset(skip).limit(limit).all()
 
     @staticmethod
-    def get_diary_entry_by_id(db: Session, user_id: int, entry_id: int) -> Optional[DiaryEntry]:
+    def get_diary_entry_by_id(db: Session, user_id: int, entry_id: int,
+                              projection: Optional[Tuple[tuple, tuple]] = None) -> Optional[DiaryEntry]:
         """Obtener entrada específica con todas las relaciones usando ORM"""
+        # El usuario no se carga: vive en el primario, no en el shard
         return db.query(DiaryEntry).filter(
             DiaryEntry.id == entry_id,
             DiaryEntry.user_id == user_id
-        ).options(
-            joinedload(DiaryEntry.emotions),
-            joinedload(DiaryEntry.media_files),
-            joinedload(DiaryEntry.user)
-        ).first()
+        ).options(*DiaryService.entry_load_options(projection)).first()
 
     @staticmethod
-    def get_diary_entry_by_date(db: Session, user_id: int, entry_date: date) -> Optional[DiaryEntry]:
+    def get_diary_entry_by_date(db: Session, user_id: int, entry_date: date,
+                                projection: Optional[Tuple[tuple, tuple]] = None) -> Optional[DiaryEntry]:
         """Obtener entrada por fecha con relaciones usando ORM"""
         return db.query(DiaryEntry).filter(
             DiaryEntry.user_id == user_id,
             func.TRUNC(DiaryEntry.entry_date) == entry_date
         ).options(
-            joinedload(DiaryEntry.emotions),
-            joinedload(DiaryEntry.media_files)
+            *DiaryService.entry_load_options(projection)
         ).first()
 
+    @staticmethod
+    def user_owns_entry(db: Session, user_id: int, entry_id: int) -> bool:
+        """Comprobar que la entrada existe y pertenece al usuario (consulta solo del id)"""
+        # Caché por sesión: cada request usa su propia sesión de get_db
+        owned_entries = db.info.setdefault("owned_entries", set())
+        if (user_id, entry_id) in owned_entries:
+            return True
+
+        owned = db.query(DiaryEntry.id).filter(
+            DiaryEntry.id == entry_id,
+            DiaryEntry.user_id == user_id
+        ).first() is not None
+
+        if owned:
+            owned_entries.add((user_id, entry_id))
+        return owned
+
     @staticmethod
     def update_diary_entry(db: Session, user_id: int, entry_id: int, diary_data: DiaryEntryUpdate) -> Optional[DiaryEntry]:
         """Actualizar entrada de diario usando ORM"""
-        diary_entry = DiaryService.get_diary_entry_by_id(db, user_id, entry_id)
-        
-        if not diary_entry:
-            return None
-        
-        # Actualizar campos usando ORM
+        SyncService.lock_changes(db, user_id)
+        values = {DiaryEntry.updated_at: datetime.utcnow()}
         if diary_data.title is not None:
-            diary_entry.title = diary_data.title
+            values[DiaryEntry.title] = diary_data.title
         if diary_data.content is not None:
-            diary_entry.content = diary_data.content
+            values[DiaryEntry.content] = diary_data.content
         if diary_data.entry_date is not None:
-            diary_entry.entry_date = diary_data.entry_date
-        
-        diary_entry.updated_at = datetime.utcnow()
-        
+            # Mismo criterio que al crear: una sola entrada por día
+            existing_entry = db.query(DiaryEntry.id).filter(
+                DiaryEntry.user_id == user_id,
+                DiaryEntry.id != entry_id,
+                func.TRUNC(DiaryEntry.entry_date) == diary_data.entry_date
+            ).first()
+            if existing_entry:
+                raise ValueError("Ya existe una entrada para esta fecha")
+            values[DiaryEntry.entry_date] = diary_data.entry_date
+
+        # El filtro por user_id hace a la vez de comprobación de propiedad
+        diary_entry = db.scalars(
+            update(DiaryEntry).where(
+                DiaryEntry.id == entry_id,
+                DiaryEntry.user_id == user_id
+            ).values(values).returning(DiaryEntry),
+            execution_options={"populate_existing": True}
+        ).first()
+
+        if not diary_entry:
+            return None
+
+        # Cargar las relaciones ahora, en una consulta por tabla, y no de
+        # forma perezosa al serializar la respuesta
+        set_committed_value(diary_entry, "emotions", db.scalars(
+            select(EmotionRecord).where(EmotionRecord.diary_entry_id == entry_id).order_by(EmotionRecord.id)
+        ).all())
+        set_committed_value(diary_entry, "media_files", db.scalars(
+            select(MediaFile).where(MediaFile.diary_entry_id == entry_id).order_by(MediaFile.id)
+        ).all())
+
+        queue_event(db, user_id, ENTRY_UPDATED, _entry_event(diary_entry))
         db.commit()
-        db.refresh(diary_entry)
         return diary_entry
 
     @staticmethod
     def delete_diary_entry(db: Session, user_id: int, entry_id: int) -> bool:
         """Eliminar entrada de diario y sus relaciones usando ORM"""
-        diary_entry = DiaryService.get_diary_entry_by_id(db, user_id, entry_id)
-        
-        if not diary_entry:
+        if not DiaryService.user_owns_entry(db, user_id, entry_id):
             return False
-        
-        # El ORM se encarga de eliminar las relaciones automáticamente
-        # gracias a cascade="all, delete-orphan"
-        db.delete(diary_entry)
+
+        # Tombstones para que los clientes sincronizados eliminen su copia
+        SyncService.record_deletions(
+            db, user_id, ENTITY_EMOTION,
+            select(EmotionRecord.id).where(EmotionRecord.diary_entry_id == entry_id)
+        )
+        SyncService.record_deletions(
+            db, user_id, ENTITY_MEDIA,
+            select(MediaFile.id).where(MediaFile.diary_entry_id == entry_id)
+        )
+        SyncService.record_deletions(db, user_id, ENTITY_ENTRY, entry_id)
+        # Los archivos físicos se borran en segundo plano tras el commit
+        file_paths = db.query(MediaFile.file_path).filter(
+            MediaFile.diary_entry_id == entry_id
+        ).all()
+        enqueue_many(db, DELETE_MEDIA_FILE, [{"file_path": file_path} for (file_path,) in file_paths])
+
+        # Borrado directo de hijos y entrada, sin cargar el grafo en memoria
+        db.query(EmotionRecord).filter(
+            EmotionRecord.diary_entry_id == entry_id
+        ).delete(synchronize_session=False)
+        db.query(MediaFile).filter(
+            MediaFile.diary_entry_id == entry_id
+        ).delete(synchronize_session=False)
+        db.query(DiaryEntry).filter(
+            DiaryEntry.id == entry_id
+        ).delete(synchronize_session=False)
+
+        queue_event(db, user_id, ENTRY_DELETED, {"id": entry_id})
         db.commit()
+        db.info.get("owned_entries", set()).discard((user_id, entry_id))
         return True
 
     @staticmethod
     def add_emotion_to_entry(db: Session, user_id: int, entry_id: int, emotion_data: EmotionCreate) -> EmotionRecord:
         """Añadir emoción a entrada existente usando ORM"""
-        diary_entry = DiaryService.get_diary_entry_by_id(db, user_id, entry_id)
-        
-        if not diary_entry:
+        if not DiaryService.user_owns_entry(db, user_id, entry_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Entrada del diario no encontrada"
             )
+        SyncService.lock_changes(db, user_id)
         
-        emotion = EmotionRecord(
-            diary_entry_id=entry_id,
-            emotion_type=emotion_data.emotion_type,
-            intensity=emotion_data.intensity,
-            icon=emotion_data.icon,
-            notes=emotion_data.notes
-        )
+        emotion = db.scalars(
+            insert(EmotionRecord).values(
+                diary_entry_id=entry_id,
+                emotion_code=emotion_catalog.code_for(db, emotion_data.emotion_type, emotion_data.icon),
+                intensity=emotion_data.intensity,
+                notes=emotion_data.notes
+            ).returning(EmotionRecord)
+        ).one()
         
-        db.add(emotion)
+        queue_event(db, user_id, EMOTION_CREATED, _emotion_event(emotion))
         db.commit()
-        db.refresh(emotion)
         return emotion
 
     @staticmethod
     def update_emotion(db: Session, user_id: int, emotion_id: int, emotion_data: EmotionCreate) -> Optional[EmotionRecord]:
         """Actualizar emoción existente usando ORM"""
-        emotion = db.query(EmotionRecord).join(DiaryEntry).filter(
-            EmotionRecord.id == emotion_id,
-            DiaryEntry.user_id == user_id
+        SyncService.lock_changes(db, user_id)
+        user_entries = select(DiaryEntry.id).where(DiaryEntry.user_id == user_id)
+        emotion = db.scalars(
+            update(EmotionRecord).where(
+                EmotionRecord.id == emotion_id,
+                EmotionRecord.diary_entry_id.in_(user_entries)
+            ).values(
+                emotion_code=emotion_catalog.code_for(db, emotion_data.emotion_type, emotion_data.icon),
+                intensity=emotion_data.intensity,
+                notes=emotion_data.notes
+            ).returning(EmotionRecord),
+            execution_options={"populate_existing": True}
         ).first()
         
         if not emotion:
             return None
         
-        emotion.emotion_type = emotion_data.emotion_type
-        emotion.intensity = emotion_data.intensity
-        emotion.icon = emotion_data.icon
-        emotion.notes = emotion_data.notes
-        
+        queue_event(db, user_id, EMOTION_UPDATED, _emotion_event(emotion))
         db.commit()
-        db.refresh(emotion)
         return emotion
 
     @staticmethod
     def delete_emotion(db: Session, user_id: int, emotion_id: int) -> bool:
         """Eliminar emoción usando ORM"""
-        emotion = db.query(EmotionRecord).join(DiaryEntry).filter(
+        user_entries = select(DiaryEntry.id).where(DiaryEntry.user_id == user_id)
+        deleted = db.query(EmotionRecord).filter(
             EmotionRecord.id == emotion_id,
-            DiaryEntry.user_id == user_id
-        ).first()
+            EmotionRecord.diary_entry_id.in_(user_entries)
+        ).delete(synchronize_session=False)
         
-        if not emotion:
+        if not deleted:
             return False
         
-        db.delete(emotion)
+        SyncService.record_deletions(db, user_id, ENTITY_EMOTION, emotion_id)
+        queue_event(db, user_id, EMOTION_DELETED, {"id": emotion_id})
         db.commit()
         return True
 
@@ -182,26 +346,32 @@ class DiaryService:
         """Obtener resumen de emociones usando ORM con agregaciones"""
         from sqlalchemy import case
         
-        # Consulta usando ORM con funciones de agregación
+        # Consulta usando ORM con funciones de agregación. Se agrupa por
+        # nombre, como en las tendencias: una emoción con varios iconos tiene
+        # un código por icono y se cuenta una sola vez
         emotion_stats = db.query(
-            EmotionRecord.emotion_type,
-            EmotionRecord.icon,
+            EmotionCatalog.name.label('emotion_type'),
+            func.max(EmotionCatalog.icon).label('icon'),
             func.count(EmotionRecord.id).label('count'),
             func.avg(EmotionRecord.intensity).label('average_intensity'),
             func.sum(EmotionRecord.intensity).label('total_intensity')
-        ).join(DiaryEntry).filter(
+        ).select_from(EmotionRecord).join(
+            DiaryEntry, DiaryEntry.id == EmotionRecord.diary_entry_id
+        ).join(
+            EmotionCatalog, EmotionCatalog.code == EmotionRecord.emotion_code
+        ).filter(
             DiaryEntry.user_id == user_id,
             func.TRUNC(DiaryEntry.entry_date) >= start_date,
             func.TRUNC(DiaryEntry.entry_date) <= end_date
         ).group_by(
-            EmotionRecord.emotion_type,
-            EmotionRecord.icon
+            EmotionCatalog.name
         ).all()
         
         # Convertir a diccionario
         summary = {}
         for stat in emotion_stats:
             summary[stat.emotion_type] = {
+                "emotion_type": stat.emotion_type,
                 "count": stat.count,
                 "average_intensity": float(stat.average_intensity) if stat.average_intensity else 0,
                 "total_intensity": stat.total_intensity,
@@ -211,19 +381,151 @@ class DiaryService:
         return summary
 
     @staticmethod
-    def get_entries_with_emotions(db: Session, user_id: int, emotion_type: str = None) -> List[DiaryEntry]:
+    def get_emotion_trends(db: Session, user_id: int, start_date: date, end_date: date,
+                           granularity: str = "day", window: int = 7) -> dict:
+        """Obtener series temporales de emociones agrupadas en la base de datos"""
+        if granularity not in TREND_GRANULARITIES:
+            raise ValueError("Granularidad no soportada")
+        if window < 1:
+            raise ValueError("La ventana debe ser mayor que cero")
+
+        # Agregación por bucket y emoción directamente en Oracle
+        # El formato va como literal para que SELECT y GROUP BY compartan expresión
+        bucket = func.TRUNC(DiaryEntry.entry_date, literal_column(f"'{TREND_GRANULARITIES[granularity]}'"))
+        buckets = db.query(
+            bucket.label('bucket'),
+            EmotionCatalog.name.label('emotion_type'),
+            func.count(EmotionRecord.id).label('count'),
+            func.sum(EmotionRecord.intensity).label('total_intensity')
+        ).join(DiaryEntry).join(
+            # Una emoción puede tener varios códigos (uno por icono)
+            EmotionCatalog, EmotionCatalog.code == EmotionRecord.emotion_code
+        ).filter(
+            DiaryEntry.user_id == user_id,
+            func.TRUNC(DiaryEntry.entry_date) >= start_date,
+            func.TRUNC(DiaryEntry.entry_date) <= end_date
+        ).group_by(
+            bucket,
+            EmotionCatalog.name
+        ).subquery()
+
+        # Media móvil ponderada sobre los últimos `window` periodos de cada
+        # emoción. La ventana es RANGE sobre el número de periodo: los días,
+        # semanas o meses sin entradas cuentan aunque no tengan fila
+        days = buckets.c.bucket - literal_column("DATE '1970-01-01'")
+        period = {
+            "day": days,
+            "week": days / 7,
+            "month": extract("year", buckets.c.bucket) * 12 + extract("month", buckets.c.bucket)
+        }[granularity]
+        moving_window = {
+            "partition_by": buckets.c.emotion_type,
+            "order_by": period,
+            "range_": (-(window - 1), 0)
+        }
+        rows = db.query(
+            buckets.c.bucket,
+            buckets.c.emotion_type,
+            buckets.c.count,
+            buckets.c.total_intensity,
+            func.sum(buckets.c.total_intensity).over(**moving_window).label('window_intensity'),
+            func.sum(buckets.c.count).over(**moving_window).label('window_count')
+        ).order_by(
+            buckets.c.emotion_type,
+            buckets.c.bucket
+        ).all()
+
+        series = {}
+        for row in rows:
+            bucket_date = row.bucket.date() if isinstance(row.bucket, datetime) else row.bucket
+            series.setdefault(row.emotion_type, []).append({
+                "bucket": bucket_date,
+                "count": row.count,
+                "average_intensity": float(row.total_intensity) / row.count,
+                "moving_average_intensity": float(row.window_intensity) / row.window_count
+            })
+
+        return {
+            "granularity": granularity,
+            "window": window,
+            "series": series
+        }
+
+    @staticmethod
+    def get_calendar(db: Session, user_id: int, year: int, month: Optional[int] = None) -> dict:
+        """Obtener ocupación compacta del calendario con la emoción dominante por día"""
+        if month:
+            start = date(year, month, 1)
+            end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        else:
+            start = date(year, 1, 1)
+            end = date(year + 1, 1, 1)
+
+        # Una sola proyección: día y emoción de mayor intensidad de cada entrada
+        ranked = db.query(
+            func.TRUNC(DiaryEntry.entry_date, type_=Date).label('entry_day'),
+            EmotionRecord.emotion_code.label('emotion_code'),
+            func.row_number().over(
+                partition_by=DiaryEntry.id,
+                order_by=(EmotionRecord.intensity.desc(), EmotionRecord.id)
+            ).label('emotion_rank')
+        ).outerjoin(
+            EmotionRecord, EmotionRecord.diary_entry_id == DiaryEntry.id
+        ).filter(
+            DiaryEntry.user_id == user_id,
+            DiaryEntry.entry_date >= start,
+            DiaryEntry.entry_date < end
+        ).subquery()
+
+        rows = db.query(ranked.c.entry_day, ranked.c.emotion_code).filter(
+            ranked.c.emotion_rank == 1
+        ).order_by(ranked.c.entry_day).all()
+
+        days = (end - start).days
+        occupancy = bytearray((days + 7) // 8)
+        emotions = []
+        codes = []
+        for row in rows:
+            day = row.entry_day.date() if isinstance(row.entry_day, datetime) else row.entry_day
+            offset = (day - start).days
+            # Un código por bit: si hubiera dos entradas el mismo día (datos
+            # anteriores a la comprobación de fecha duplicada), vale la primera
+            if occupancy[offset // 8] & (1 << (offset % 8)):
+                continue
+            occupancy[offset // 8] |= 1 << (offset % 8)
+            if row.emotion_code is None:
+                codes.append(0)
+                continue
+            emotion_type = emotion_catalog.resolve(row.emotion_code)[0]
+            if emotion_type not in emotions:
+                emotions.append(emotion_type)
+            codes.append(emotions.index(emotion_type) + 1)
+
+        return {
+            "start_date": start,
+            "days": days,
+            "occupancy": base64.b64encode(bytes(occupancy)).decode("ascii"),
+            "emotions": emotions,
+            "codes": codes
+        }
+
+    @staticmethod
+    def get_entries_with_emotions(db: Session, user_id: int, emotion_type: str = None,
+                                  projection: Optional[Tuple[tuple, tuple]] = None) -> List[DiaryEntry]:
         """Obtener entradas filtradas por tipo de emoción usando ORM"""
         query = db.query(DiaryEntry).filter(
             DiaryEntry.user_id == user_id
         ).options(
-            joinedload(DiaryEntry.emotions),
-            joinedload(DiaryEntry.media_files)
+            *DiaryService.entry_load_options(projection)
         )
         
         if emotion_type:
-            query = query.join(EmotionRecord).filter(
-                EmotionRecord.emotion_type == emotion_type
-            )
+            # Semijoin: una entrada con varias emociones del tipo no se repite
+            query = query.filter(DiaryEntry.id.in_(
+                select(EmotionRecord.diary_entry_id).where(
+                    EmotionRecord.emotion_code.in_(emotion_catalog.codes_for_name(emotion_type))
+                )
+            ))
         
         return query.order_by(DiaryEntry.entry_date.desc()).all()
 
@@ -0,0 +1,132 @@
+import threading
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from database import SessionLocal
+from models.diary import EmotionCatalog
+
+
+class EmotionCatalogCache:
+    """
+    Caché de proceso del catálogo de emociones (código <-> nombre e icono).
+
+    El catálogo es pequeño y casi inmutable: se carga entero en el primer
+    uso y se recarga solo cuando aparece un código o nombre desconocido
+    (creado por otro proceso). El catálogo maestro está en el primario y las
+    altas usan su propia sesión para confirmarse aunque la petición que las
+    origina falle. Cada shard guarda una copia de los códigos que usa.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._by_code: dict = {}
+        self._by_key: dict = {}
+        # (engine, código) ya presentes en la copia de un shard
+        self._replicated: set = set()
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session = None):
+        if db is None:
+            with self.session_factory() as catalog_db:
+                return self._load(catalog_db)
+        rows = db.query(EmotionCatalog.code, EmotionCatalog.name, EmotionCatalog.icon).all()
+        with self._lock:
+            for code, name, icon in rows:
+                self._by_code[code] = (name, icon)
+                self._by_key[(name, icon)] = code
+
+    def resolve(self, code: int) -> Tuple[str, Optional[str]]:
+        """Nombre e icono de un código"""
+        entry = self._by_code.get(code)
+        if entry is None:
+            self._load()
+            entry = self._by_code[code]
+        return entry
+
+    @staticmethod
+    def _validate(name: str, icon: Optional[str]):
+        """Comprobar un par nuevo antes de darlo de alta (límites de las columnas)"""
+        name_column, icon_column = EmotionCatalog.__table__.c.name, EmotionCatalog.__table__.c.icon
+        if not isinstance(name, str) or not name.strip():
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El tipo de emoción es obligatorio"
+            )
+        if len(name) > name_column.type.length:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"El tipo de emoción admite como máximo {name_column.type.length} caracteres"
+            )
+        if icon is not None and (not isinstance(icon, str) or len(icon) > icon_column.type.length):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"El icono admite como máximo {icon_column.type.length} caracteres"
+            )
+
+    def code_for(self, db: Session, name: str, icon: Optional[str] = None) -> int:
+        """
+        Código de un par (nombre, icono), creándolo si no existe y
+        asegurando que está en el catálogo del shard de `db`
+        """
+        key = (name, icon)
+        code = self._by_key.get(key)
+        if code is None:
+            self._validate(name, icon)
+            with self.session_factory() as catalog_db:
+                self._load(catalog_db)
+                if key not in self._by_key:
+                    try:
+                        catalog_db.execute(insert(EmotionCatalog).values(name=name, icon=icon))
+                        catalog_db.commit()
+                    except IntegrityError:
+                        catalog_db.rollback()
+                        self._load(catalog_db)
+                        # Solo es una carrera si otro proceso la creó a la vez
+                        if key not in self._by_key:
+                            raise
+                    else:
+                        self._load(catalog_db)
+            code = self._by_key[key]
+        self.ensure_on(db, [code])
+        return code
+
+    def ensure_on(self, db: Session, codes: Iterable[int]):
+        """Copiar al catálogo del shard de `db` los códigos que aún no tenga"""
+        bind = db.get_bind()
+        if bind is self.session_factory.kw.get("bind"):
+            return
+        missing = [code for code in set(codes) if (bind, code) not in self._replicated]
+        if not missing:
+            return
+
+        with Session(bind=bind) as shard_db:
+            present = {
+                code for (code,) in shard_db.query(EmotionCatalog.code).filter(EmotionCatalog.code.in_(missing))
+            }
+            for code in missing:
+                if code in present:
+                    continue
+                name, icon = self.resolve(code)
+                try:
+                    shard_db.execute(insert(EmotionCatalog).values(code=code, name=name, icon=icon))
+                    shard_db.commit()
+                except IntegrityError:
+                    shard_db.rollback()
+                    # Solo es una carrera si otro proceso lo copió a la vez
+                    if shard_db.get(EmotionCatalog, code) is None:
+                        raise
+        with self._lock:
+            self._replicated.update((bind, code) for code in missing)
+
+    def codes_for_name(self, name: str) -> List[int]:
+        """Todos los códigos de una emoción (uno por icono usado)"""
+        codes = [code for (entry_name, _), code in list(self._by_key.items()) if entry_name == name]
+        if not codes:
+            self._load()
+            codes = [code for (entry_name, _), code in list(self._by_key.items()) if entry_name == name]
+        return codes
+
+
+emotion_catalog = EmotionCatalogCache()
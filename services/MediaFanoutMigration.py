@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import logging
+from models.media import MediaFile
+from services.MediaService import prefix_for, fanout_key
+from services.SyncService import SyncService
+from storage import get_storage
+from sharding import data_session_factories
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_to_fanout(session_factory=None, storage=None, batch_size: int = 200,
+                            pause_seconds: float = 0.1, dry_run: bool = False) -> dict:
+    """
+    Mover los archivos existentes al reparto por hash sin parar el servicio.
+
+    Para cada lote: se copia el objeto a su nueva clave (enlace duro en disco
+    local), se actualiza `file_path` (solo si no cambió entretanto) y, tras el
+    commit, se elimina la clave antigua. Durante todo el proceso ambas rutas
+    son válidas. Sin `session_factory` se recorren todos los shards.
+    """
+    if session_factory is None:
+        stats = {"checked": 0, "moved": 0, "missing": 0}
+        for shard_factory in data_session_factories():
+            shard_stats = await migrate_to_fanout(shard_factory, storage, batch_size, pause_seconds, dry_run)
+            for key in stats:
+                stats[key] += shard_stats[key]
+        return stats
+
+    storage = storage or get_storage()
+    stats = {"checked": 0, "moved": 0, "missing": 0}
+    last_id = 0
+
+    while True:
+        with session_factory() as db:
+            rows = db.query(
+                MediaFile.id, MediaFile.user_id, MediaFile.filename, MediaFile.file_type, MediaFile.file_path
+            ).filter(
+                MediaFile.id > last_id
+            ).order_by(MediaFile.id).limit(batch_size).all()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            moved = []
+            for row in rows:
+                stats["checked"] += 1
+                source_key = storage.key_for(row.file_path)
+                target_key = fanout_key(prefix_for(row.file_type), row.filename)
+                if source_key == target_key:
+                    continue
+                if await storage.stat(source_key) is None:
+                    stats["missing"] += 1
+                    logger.warning("Archivo no encontrado para media %s: %s", row.id, row.file_path)
+                    continue
+                if dry_run:
+                    stats["moved"] += 1
+                    continue
+
+                await storage.copy(source_key, target_key)
+                # La actualización toma un change_seq nuevo
+                SyncService.lock_changes(db, row.user_id)
+                updated = db.query(MediaFile).filter(
+                    MediaFile.id == row.id,
+                    MediaFile.file_path == row.file_path
+                ).update({MediaFile.file_path: storage.locate(target_key)}, synchronize_session=False)
+                if updated:
+                    moved.append(source_key)
+
+            db.commit()
+
+        # La clave antigua solo se retira cuando la nueva ya está confirmada
+        for source_key in moved:
+            await storage.delete(source_key)
+        stats["moved"] += len(moved)
+
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+
+    logger.info("Migración a reparto por hash: %s", stats)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrar uploads al reparto por hash")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.1)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(migrate_to_fanout(
+        batch_size=args.batch_size, pause_seconds=args.pause, dry_run=args.dry_run
+    )))
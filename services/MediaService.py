@@ -1,26 +1,58 @@
 import os
 import uuid
 import base64
+import hashlib
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from models.media import MediaFile
 from models.diary import DiaryEntry
+from services.DiaryService import DiaryService
+from services.SyncService import SyncService, ENTITY_MEDIA
+from jobs import enqueue
+from jobs.handlers import DELETE_MEDIA_FILE
 from fastapi import UploadFile, HTTPException, status
 from datetime import datetime
-from typing import List
-import aiofiles
+from typing import AsyncIterator, List
 from config import settings
+from storage import get_storage
+from services.media_metadata import MediaMetadataExtractor
 
-# Configuración de directorios
-UPLOAD_DIR = "uploads"
-AUDIO_DIR = os.path.join(UPLOAD_DIR, "audio")
-DRAWING_DIR = os.path.join(UPLOAD_DIR, "drawings")
-IMAGES_DIR = os.path.join(UPLOAD_DIR, "images")
+# Directorio del backend local (también servido en /uploads)
+UPLOAD_DIR = settings.storage_local_root
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Prefijos de clave por tipo de archivo
+MEDIA_PREFIXES = ("audio", "drawings", "images")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def prefix_for(file_type: str) -> str:
+    """Prefijo de almacenamiento de un tipo de archivo multimedia"""
+    if file_type == 'audio':
+        return "audio"
+    elif file_type == 'drawing':
+        return "drawings"
+    return "images"
+
+
+def fanout_key(prefix: str, filename: str) -> str:
+    """Clave con reparto por hash en dos niveles, p. ej. drawings/ab/cd/<uuid>.png"""
+    digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    return f"{prefix}/{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+async def _iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    """Leer el archivo subido por bloques en lugar de cargarlo entero"""
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    yield data
 
-# Crear directorios si no existen
-os.makedirs(AUDIO_DIR, exist_ok=True)
-os.makedirs(DRAWING_DIR, exist_ok=True)
-os.makedirs(IMAGES_DIR, exist_ok=True)
 
 class MediaService:
     
@@ -30,46 +62,41 @@ class MediaService:
         file_extension = os.path.splitext(file.filename)[1]
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         
-        if file_type == 'audio':
-            save_dir = AUDIO_DIR
-        elif file_type == 'drawing':
-            save_dir = DRAWING_DIR
-        else:
-            save_dir = IMAGES_DIR
-        
-        file_path = os.path.join(save_dir, unique_filename)
-        
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        storage = get_storage()
+        key = fanout_key(prefix_for(file_type), unique_filename)
+        # Los metadatos se extraen de las cabeceras mientras se transmite
+        extractor = MediaMetadataExtractor()
+        file_size = await storage.put_stream(key, extractor.wrap(_iter_upload(file)), file.content_type)
         
         return {
             'filename': unique_filename,
             'original_filename': file.filename,
-            'file_path': file_path,
-            'file_size': len(content)
+            'file_path': storage.locate(key),
+            'file_size': file_size,
+            **extractor.result()
         }
 
     @staticmethod
     async def save_drawing(drawing_data: str, file_type: str, user_id: int) -> dict:
         """Guardar dibujo desde base64 usando ORM"""
         unique_filename = f"{uuid.uuid4()}.png"
-        save_dir = DRAWING_DIR
-        file_path = os.path.join(save_dir, unique_filename)
+        storage = get_storage()
+        key = fanout_key(prefix_for('drawing'), unique_filename)
         
         try:
             if ',' in drawing_data:
                 drawing_data = drawing_data.split(',')[1]
             
             image_data = base64.b64decode(drawing_data)
-            async with aiofiles.open(file_path, 'wb') as out_file:
-                await out_file.write(image_data)
+            extractor = MediaMetadataExtractor()
+            await storage.put_stream(key, extractor.wrap(_iter_bytes(image_data)), "image/png")
             
             return {
                 'filename': unique_filename,
                 'original_filename': f"drawing_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
-                'file_path': file_path,
-                'file_size': len(image_data)
+                'file_path': storage.locate(key),
+                'file_size': len(image_data),
+                **extractor.result()
             }
         except Exception as e:
             raise HTTPException(
@@ -81,33 +108,34 @@ class MediaService:
     def create_media_record(db: Session, user_id: int, diary_entry_id: int, 
                            file_info: dict, file_type: str, description: str = None) -> MediaFile:
         """Crear registro multimedia usando ORM"""
-        # Verificar relación usando ORM
-        diary_entry = db.query(DiaryEntry).filter(
-            DiaryEntry.id == diary_entry_id,
-            DiaryEntry.user_id == user_id
-        ).first()
-        
-        if not diary_entry:
+        # Verificar propiedad sin cargar la fila completa de la entrada
+        if not DiaryService.user_owns_entry(db, user_id, diary_entry_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Entrada del diario no encontrada"
             )
+        SyncService.lock_changes(db, user_id)
         
-        # Crear objeto MediaFile usando ORM
-        media_file = MediaFile(
-            diary_entry_id=diary_entry_id,
-            user_id=user_id,
-            filename=file_info['filename'],
-            original_filename=file_info['original_filename'],
-            file_type=file_type,
-            file_path=file_info['file_path'],
-            file_size=file_info['file_size'],
-            description=description
-        )
+        # INSERT ... RETURNING en lugar de add + commit + refresh
+        media_file = db.scalars(
+            insert(MediaFile).values(
+                diary_entry_id=diary_entry_id,
+                user_id=user_id,
+                filename=file_info['filename'],
+                original_filename=file_info['original_filename'],
+                file_type=file_type,
+                file_path=file_info['file_path'],
+                file_size=file_info['file_size'],
+                description=description,
+                width=file_info.get('width'),
+                height=file_info.get('height'),
+                duration_seconds=file_info.get('duration_seconds'),
+                sample_rate=file_info.get('sample_rate'),
+                channels=file_info.get('channels')
+            ).returning(MediaFile)
+        ).one()
         
-        db.add(media_file)
         db.commit()
-        db.refresh(media_file)
         return media_file
 
     @staticmethod
@@ -124,7 +152,7 @@ class MediaService:
         media_file = db.query(MediaFile).filter(
             MediaFile.id == media_id,
             MediaFile.user_id == user_id
-        ).options(joinedload(MediaFile.diary_entry), joinedload(MediaFile.user)).first()
+        ).options(joinedload(MediaFile.diary_entry)).first()
         
         if not media_file:
             raise HTTPException(
@@ -137,14 +165,25 @@ class MediaService:
     @staticmethod
     def delete_media_file(db: Session, user_id: int, media_id: int) -> bool:
         """Eliminar archivo multimedia usando ORM"""
-        media_file = MediaService.get_media_file(db, user_id, media_id)
+        # Solo se necesita la ruta del archivo para borrarlo
+        media_file = db.query(MediaFile.id, MediaFile.file_path).filter(
+            MediaFile.id == media_id,
+            MediaFile.user_id == user_id
+        ).first()
         
-        # Eliminar archivo físico
-        if os.path.exists(media_file.file_path):
-            os.remove(media_file.file_path)
+        if not media_file:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archivo multimedia no encontrado"
+            )
         
-        # Eliminar usando ORM
-        db.delete(media_file)
+        # El archivo físico lo borra el worker tras el commit, fuera de la
+        # petición (MediaSweeper recoge lo que quede huérfano)
+        db.query(MediaFile).filter(
+            MediaFile.id == media_id
+        ).delete(synchronize_session=False)
+        SyncService.record_deletions(db, user_id, ENTITY_MEDIA, media_id)
+        enqueue(db, DELETE_MEDIA_FILE, {"file_path": media_file.file_path})
         db.commit()
         
         return True
@@ -152,10 +191,8 @@ class MediaService:
     @staticmethod
     def get_media_with_relations(db: Session, media_id: int, user_id: int):
         """Obtener multimedia con todas sus relaciones usando ORM"""
+        # Sin MediaFile.user: los usuarios viven en el primario, no en el shard
         return db.query(MediaFile).filter(
             MediaFile.id == media_id,
             MediaFile.user_id == user_id
-        ).options(
-            joinedload(MediaFile.diary_entry),
-            joinedload(MediaFile.user)
-        ).first()
\ No newline at end of file
+        ).options(joinedload(MediaFile.diary_entry)).first()
\ No newline at end of file
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import logging
+import posixpath
+import threading
+import time
+from models.media import MediaFile
+from services.MediaService import MEDIA_PREFIXES
+from services.UploadSessionService import UploadSessionService
+from sharding import data_session_factories
+from jobs.leases import acquire_lease, release_lease, lease_holder
+from storage import get_storage, get_quarantine_storage
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SWEEPER_LEASE = "media_sweeper"
+
+
+class MediaSweeper:
+    """
+    Reconciliación entre el almacenamiento de multimedia y `media_files`.
+
+    Recorre los objetos del backend (os.scandir en disco local) en lotes,
+    consulta qué nombres de archivo siguen referenciados y elimina (o mueve a
+    cuarentena) el resto; con shards, basta con que lo referencie uno de
+    ellos. Los borrados normales los hace la cola de trabajos; este proceso
+    recoge lo que quede huérfano (subidas interrumpidas, trabajos
+    fallidos...). Cada pasada toma el lease `media_sweeper` y lo renueva
+    en cada lote, así que con varios procesos solo barre uno a la vez.
+    """
+
+    def __init__(self, session_factories=None, storage=None, quarantine_storage=None,
+                 prefixes=MEDIA_PREFIXES, batch_size: int = None, pause_seconds: float = None,
+                 grace_seconds: int = None, quarantine: bool = None):
+        self.session_factories = session_factories or data_session_factories()
+        self.storage = storage or get_storage()
+        self.prefixes = prefixes
+        # Oracle admite como máximo 1000 elementos en un IN
+        self.batch_size = min(batch_size or settings.media_sweeper_batch_size, 1000)
+        self.pause_seconds = settings.media_sweeper_pause_seconds if pause_seconds is None else pause_seconds
+        self.grace_seconds = settings.media_sweeper_grace_seconds if grace_seconds is None else grace_seconds
+        quarantine = bool(settings.media_quarantine_dir) if quarantine is None else quarantine
+        self.quarantine_storage = (quarantine_storage or get_quarantine_storage()) if quarantine else None
+
+    async def _iter_batches(self):
+        batch = []
+        for prefix in self.prefixes:
+            async for stored_object in self.storage.iter_objects(prefix):
+                batch.append(stored_object)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def _dispose(self, key: str) -> bool:
+        """Eliminar o mover a cuarentena un archivo huérfano"""
+        if self.quarantine_storage is not None:
+            await self.quarantine_storage.put_stream(key, self.storage.get_stream(key))
+        return await self.storage.delete(key)
+
+    async def run_once(self) -> dict:
+        """Ejecutar una pasada completa de reconciliación, si ningún otro proceso la está haciendo"""
+        holder = lease_holder()
+        if not acquire_lease(SWEEPER_LEASE, holder, settings.media_sweeper_lease_seconds):
+            logger.info("Reconciliación de multimedia en curso en otro proceso")
+            return {"skipped": True}
+        try:
+            return await self._sweep(holder)
+        finally:
+            release_lease(SWEEPER_LEASE, holder)
+
+    async def _sweep(self, holder: str) -> dict:
+        stats = {"scanned": 0, "orphans": 0, "disposed": 0}
+        stats["expired_uploads"] = await UploadSessionService.purge_expired()
+        cutoff = time.time() - self.grace_seconds
+
+        async for batch in self._iter_batches():
+            if not acquire_lease(SWEEPER_LEASE, holder, settings.media_sweeper_lease_seconds):
+                logger.warning("Lease de la reconciliación perdido; se interrumpe la pasada")
+                break
+            stats["scanned"] += len(batch)
+            names = {posixpath.basename(stored_object.key) for stored_object in batch}
+
+            known = set()
+            for session_factory in self.session_factories:
+                pending = names - known
+                if not pending:
+                    break
+                with session_factory() as db:
+                    known.update(
+                        filename for (filename,) in db.query(MediaFile.filename).filter(
+                            MediaFile.filename.in_(pending)
+                        )
+                    )
+
+            for stored_object in batch:
+                if posixpath.basename(stored_object.key) in known:
+                    continue
+                # Periodo de gracia: el archivo se escribe antes de su fila
+                if stored_object.modified > cutoff:
+                    continue
+                stats["orphans"] += 1
+                try:
+                    if await self._dispose(stored_object.key):
+                        stats["disposed"] += 1
+                except FileNotFoundError:
+                    continue
+
+            # Limitar la E/S entre lotes
+            if self.pause_seconds:
+                await asyncio.sleep(self.pause_seconds)
+
+        logger.info("Reconciliación de multimedia: %s", stats)
+        return stats
+
+    def run_forever(self, interval_seconds: int, stop_event: threading.Event = None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                asyncio.run(self.run_once())
+            except Exception:
+                logger.exception("Error en la reconciliación de multimedia")
+            stop_event.wait(interval_seconds)
+
+
+def start_background_sweeper() -> threading.Event:
+    """Lanzar el sweeper en un hilo demonio; devuelve el evento para detenerlo"""
+    stop_event = threading.Event()
+    if settings.media_sweeper_interval_seconds > 0:
+        thread = threading.Thread(
+            target=MediaSweeper().run_forever,
+            args=(settings.media_sweeper_interval_seconds, stop_event),
+            name="media-sweeper",
+            daemon=True
+        )
+        thread.start()
+    return stop_event
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconciliar el almacenamiento con media_files")
+    parser.add_argument("--once", action="store_true", help="Ejecutar una sola pasada")
+    parser.add_argument("--delete", action="store_true", help="Borrar en vez de mover a cuarentena")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sweeper = MediaSweeper(quarantine=False if args.delete else None)
+    if args.once:
+        print(asyncio.run(sweeper.run_once()))
+    else:
+        sweeper.run_forever(settings.media_sweeper_interval_seconds or 900)
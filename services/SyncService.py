@@ -0,0 +1,147 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import event, select, insert, literal
+from sqlalchemy.exc import IntegrityError
+from models.diary import DiaryEntry, EmotionRecord
+from models.media import MediaFile
+from models.sync import SyncTombstone, SyncClock, change_sequence
+from typing import Optional
+
+# Tipos de entidad registrados en sync_tombstones
+ENTITY_ENTRY = "entry"
+ENTITY_EMOTION = "emotion"
+ENTITY_MEDIA = "media"
+
+# El cursor de sincronización lleva la época del shard del usuario en los
+# bits altos y el change_seq en los bajos
+CURSOR_SEQ_BITS = 40
+CURSOR_SEQ_MASK = (1 << CURSOR_SEQ_BITS) - 1
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_change_locks(session):
+    session.info.pop("change_locks", None)
+
+
+class SyncService:
+
+    @staticmethod
+    def lock_changes(db: Session, user_id: int) -> None:
+        """
+        Bloquear hasta el commit la fila de sync_clocks del usuario.
+
+        Toda transacción que escriba filas con change_seq del usuario debe
+        llamarlo antes de la primera escritura: así sus transacciones toman
+        valores de la secuencia por turnos y cada una confirma antes de que
+        la siguiente tome los suyos. Para un usuario, un change_seq visible
+        implica que todos los menores ya son visibles, y el cursor de
+        get_changes no necesita margen.
+        """
+        if user_id in db.info.get("change_locks", ()):
+            return
+        lock = select(SyncClock.user_id).where(SyncClock.user_id == user_id).with_for_update()
+        if db.execute(lock).first() is None:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(SyncClock).values(user_id=user_id))
+            except IntegrityError:
+                # Otra transacción la creó a la vez: esperar a su commit
+                db.execute(lock)
+        # El rollback del savepoint vacía la marca: se añade al final
+        db.info.setdefault("change_locks", set()).add(user_id)
+
+    @staticmethod
+    def record_deletions(db: Session, user_id: int, entity_type: str, ids) -> None:
+        """
+        Registrar tombstones para entidades que se van a borrar.
+
+        `ids` puede ser un id o un SELECT de ids; en ese caso se inserta con
+        INSERT ... SELECT sin traer las filas a Python. Debe ejecutarse en la
+        misma transacción que el borrado.
+        """
+        SyncService.lock_changes(db, user_id)
+        if isinstance(ids, int):
+            db.execute(insert(SyncTombstone).values(
+                user_id=user_id, entity_type=entity_type, entity_id=ids
+            ))
+            return
+
+        db.execute(insert(SyncTombstone).from_select(
+            ["change_seq", "user_id", "entity_type", "entity_id"],
+            ids.with_only_columns(
+                change_sequence.next_value(), literal(user_id), literal(entity_type),
+                *ids.selected_columns
+            )
+        ))
+
+    @staticmethod
+    def get_changes(db: Session, user_id: int, since: int = 0, limit: int = 500) -> dict:
+        """
+        Cambios del usuario posteriores al cursor `since`.
+
+        Cada tabla se lee por su índice (user_id, change_seq), o las emociones
+        por (diary_entry_id, change_seq), hasta `limit` filas. Si alguna
+        llega al límite, el cursor devuelto es el menor change_seq alcanzado
+        entre las que se cortaron y se descarta lo posterior, de modo que la
+        siguiente página no pierde cambios.
+
+        change_seq se asigna al escribir, no al confirmar, pero las
+        escrituras de un usuario se serializan con lock_changes: ninguna
+        transacción en curso puede confirmar después un valor menor que el
+        último visible, así que en la última página el cursor es el último
+        change_seq devuelto.
+
+        Los change_seq son de cada shard: al mover al usuario de shard sus
+        filas reciben valores nuevos, que pueden quedar por debajo del cursor
+        del cliente. El cursor incluye la época del usuario (ver
+        UserShard.epoch, en `db.info["shard_epoch"]`) y uno de una época
+        anterior se trata como 0, forzando una sincronización completa.
+        """
+        epoch = db.info.get("shard_epoch", 0)
+        if since >> CURSOR_SEQ_BITS != epoch:
+            since = 0
+        since &= CURSOR_SEQ_MASK
+
+        user_entries = select(DiaryEntry.id).where(DiaryEntry.user_id == user_id)
+        sources = {
+            "entries": db.query(DiaryEntry).filter(
+                DiaryEntry.user_id == user_id,
+                DiaryEntry.change_seq > since
+            ),
+            "emotions": db.query(EmotionRecord).filter(
+                EmotionRecord.diary_entry_id.in_(user_entries),
+                EmotionRecord.change_seq > since
+            ),
+            "media_files": db.query(MediaFile).filter(
+                MediaFile.user_id == user_id,
+                MediaFile.change_seq > since
+            ),
+            "deleted": db.query(SyncTombstone).filter(
+                SyncTombstone.user_id == user_id,
+                SyncTombstone.change_seq > since
+            )
+        }
+
+        changes = {}
+        cutoff: Optional[int] = None
+        for name, query in sources.items():
+            model = query.column_descriptions[0]["entity"]
+            rows = query.order_by(model.change_seq).limit(limit).all()
+            changes[name] = rows
+            if len(rows) == limit:
+                last_seq = rows[-1].change_seq
+                cutoff = last_seq if cutoff is None else min(cutoff, last_seq)
+
+        if cutoff is not None:
+            for name, rows in changes.items():
+                changes[name] = [row for row in rows if row.change_seq <= cutoff]
+            cursor = cutoff
+        else:
+            cursor = max(
+                [since] + [rows[-1].change_seq for rows in changes.values() if rows]
+            )
+
+        return {
+            "cursor": (epoch << CURSOR_SEQ_BITS) | cursor,
+            "has_more": cutoff is not None,
+            **changes
+        }
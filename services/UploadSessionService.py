@@ -0,0 +1,262 @@
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, Optional
+import aiofiles
+import aiofiles.os
+from anyio import to_thread
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from models.media import MediaFile
+from services.DiaryService import DiaryService
+from services.MediaService import MediaService, UPLOAD_CHUNK_SIZE, prefix_for, fanout_key
+from services.media_metadata import MediaMetadataExtractor
+from storage import get_storage
+from config import settings
+
+# Estado de las subidas en curso, fuera del directorio servido en /uploads
+SESSIONS_DIR = settings.upload_sessions_dir
+os.makedirs(SESSIONS_DIR, exist_ok=True)
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _paths(upload_id: str) -> tuple[str, str]:
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+    base = os.path.join(SESSIONS_DIR, upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+def _try_lock(part_path: str) -> Optional[int]:
+    """
+    Bloqueo exclusivo (flock) sobre el `.part`, compartido entre procesos y
+    workers del mismo host. Devuelve el descriptor que lo mantiene o None si
+    lo tiene otra petición; se libera al cerrarlo o si el proceso muere.
+    """
+    fd = os.open(part_path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+@contextmanager
+def _locked(upload_id: str) -> Iterator[None]:
+    """Una sola petición a la vez por subida (PATCH, finalizar o cancelar)"""
+    _, part_path = _paths(upload_id)
+    try:
+        fd = _try_lock(part_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+    if fd is None:
+        raise HTTPException(
+            status_code=status.HTTP_423_LOCKED,
+            detail="Hay otra petición en curso para esta subida",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        yield
+    finally:
+        os.close(fd)
+
+
+async def _iter_part(path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, 'rb') as part_file:
+        while True:
+            chunk = await part_file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class UploadSessionService:
+    """
+    Subidas reanudables en tres pasos: crear sesión, enviar bloques con PATCH
+    en un offset y finalizar.
+
+    Cada sesión son dos archivos en `SESSIONS_DIR`: `<id>.json` con los datos
+    de la subida y `<id>.part` con los bytes recibidos. El offset es el tamaño
+    del `.part`, así que un corte de conexión conserva lo ya escrito y el
+    cliente solo reenvía lo que falta. Un flock sobre el `.part` impide que
+    dos peticiones (aunque las atiendan workers distintos) escriban o
+    finalicen la misma subida a la vez; el offset se comprueba con él tomado.
+    """
+
+    @staticmethod
+    def create_session(db: Session, user_id: int, diary_entry_id: int, filename: str,
+                       content_type: str, total_size: int, description: Optional[str] = None) -> dict:
+        """Abrir una sesión de subida de audio"""
+        if not content_type.startswith('audio/'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El archivo debe ser de audio"
+            )
+        if total_size <= 0 or total_size > settings.upload_max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El tamaño debe estar entre 1 y {settings.upload_max_size} bytes"
+            )
+        if not DiaryService.user_owns_entry(db, user_id, diary_entry_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Entrada del diario no encontrada"
+            )
+
+        upload_id = uuid.uuid4().hex
+        state = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "diary_entry_id": diary_entry_id,
+            "filename": filename,
+            "content_type": content_type,
+            "description": description,
+            "total_size": total_size,
+            "created_at": time.time()
+        }
+        state_path, part_path = _paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(state_path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        return UploadSessionService._describe(state, 0)
+
+    @staticmethod
+    def _describe(state: dict, offset: int) -> dict:
+        return {
+            "upload_id": state["upload_id"],
+            "offset": offset,
+            "total_size": state["total_size"],
+            "expires_at": state["created_at"] + settings.upload_session_expire_hours * 3600
+        }
+
+    @staticmethod
+    async def _load(upload_id: str, user_id: int) -> tuple[dict, str, int]:
+        state_path, part_path = _paths(upload_id)
+        try:
+            async with aiofiles.open(state_path, 'r', encoding='utf-8') as state_file:
+                state = json.loads(await state_file.read())
+            offset = (await aiofiles.os.stat(part_path)).st_size
+        except FileNotFoundError:
+            state = None
+        if state is None or state["user_id"] != user_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subida no encontrada")
+        return state, part_path, offset
+
+    @staticmethod
+    async def get_status(upload_id: str, user_id: int) -> dict:
+        """Offset actual desde el que el cliente debe continuar"""
+        state, _, offset = await UploadSessionService._load(upload_id, user_id)
+        return UploadSessionService._describe(state, offset)
+
+    @staticmethod
+    async def append_chunk(upload_id: str, user_id: int, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Añadir bytes en `offset`, que debe coincidir con lo ya recibido.
+
+        Si el offset no coincide (reintento de un bloque ya escrito o bloque
+        perdido) se responde 409 con el offset correcto en `Upload-Offset`.
+        """
+        with _locked(upload_id):
+            state, part_path, current = await UploadSessionService._load(upload_id, user_id)
+            if offset != current:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="El offset no coincide con los bytes recibidos",
+                    headers={"Upload-Offset": str(current)}
+                )
+
+            try:
+                async with aiofiles.open(part_path, 'ab') as part_file:
+                    async for chunk in chunks:
+                        if current + len(chunk) > state["total_size"]:
+                            raise HTTPException(
+                                status_code=413,
+                                detail="Se ha superado el tamaño declarado",
+                                headers={"Upload-Offset": str(current)}
+                            )
+                        await part_file.write(chunk)
+                        current += len(chunk)
+            finally:
+                # Descartar un bloque escrito a medias por el límite de tamaño
+                if (await aiofiles.os.stat(part_path)).st_size > current:
+                    await to_thread.run_sync(os.truncate, part_path, current)
+
+        return UploadSessionService._describe(state, current)
+
+    @staticmethod
+    async def finalize(db: Session, upload_id: str, user_id: int) -> MediaFile:
+        """Pasar el archivo completo al almacenamiento y crear el registro"""
+        with _locked(upload_id):
+            state, part_path, offset = await UploadSessionService._load(upload_id, user_id)
+            if offset != state["total_size"]:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="La subida no está completa",
+                    headers={"Upload-Offset": str(offset)}
+                )
+
+            file_extension = os.path.splitext(state["filename"])[1]
+            unique_filename = f"{uuid.uuid4()}{file_extension}"
+            storage = get_storage()
+            key = fanout_key(prefix_for('audio'), unique_filename)
+            extractor = MediaMetadataExtractor()
+            file_size = await storage.put_stream(key, extractor.wrap(_iter_part(part_path)), state["content_type"])
+
+            file_info = {
+                'filename': unique_filename,
+                'original_filename': state["filename"],
+                'file_path': storage.locate(key),
+                'file_size': file_size,
+                **extractor.result()
+            }
+            media_file = MediaService.create_media_record(
+                db, user_id, state["diary_entry_id"], file_info, 'audio', state["description"]
+            )
+            await UploadSessionService._remove(upload_id)
+        return media_file
+
+    @staticmethod
+    async def cancel(upload_id: str, user_id: int):
+        """Descartar una subida y sus bytes"""
+        with _locked(upload_id):
+            await UploadSessionService._load(upload_id, user_id)
+            await UploadSessionService._remove(upload_id)
+
+    @staticmethod
+    async def _remove(upload_id: str):
+        for path in _paths(upload_id):
+            try:
+                await aiofiles.os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    async def purge_expired() -> int:
+        """Eliminar sesiones abandonadas más antiguas que la caducidad"""
+        cutoff = time.time() - settings.upload_session_expire_hours * 3600
+        purged = 0
+        for entry in await to_thread.run_sync(lambda: list(os.scandir(SESSIONS_DIR))):
+            upload_id, extension = os.path.splitext(entry.name)
+            if extension != ".json" or not UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            try:
+                fd = _try_lock(_paths(upload_id)[1])
+            except FileNotFoundError:
+                fd = None
+            if fd is None:
+                # En uso por otra petición (o ya eliminada)
+                continue
+            try:
+                await UploadSessionService._remove(upload_id)
+                purged += 1
+            finally:
+                os.close(fd)
+        return purged
@@ -1,12 +1,18 @@
 from sqlalchemy.orm import Session
 from models.user import User
-from services.utils import hash_password, verify_password, create_access_token
+from services.utils import (
+    hash_password, verify_password, create_access_token, decode_access_token,
+    create_refresh_token, decode_refresh_token, REFRESH_TOKEN_EXPIRE_DAYS
+)
+from security.revocation import revocation_store
 from schemas.UsersSchema import TokenResponse
-from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from database import get_db
+from database import get_db, get_read_db, REQUEST_SESSION_OPTIONS
+from sharding import SHARDING_ENABLED, placement_for_user, session_for_placement
 from config import settings
+from datetime import datetime, timedelta
+import math
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 SECRET_KEY = settings.secret_key
@@ -46,40 +52,141 @@ def login_user(db: Session, email: str, password: str):
     if not verify_password(password, user.hashed_password):
         return None, "Contraseña incorrecta"
 
-    token = create_access_token({
+    data_response = _issue_tokens({
         "sub": user.email,
         "id": user.id,
+        "username": user.username,
         "role": user.role.value  # <--- CORREGIDO AQUÍ TAMBIÉN
     })
 
-    data_response = TokenResponse(
+    return data_response, None
+
+
+def _issue_tokens(claims: dict, family: str = None) -> TokenResponse:
+    """Emitir access token y refresh token a partir de los claims del usuario"""
+    token = create_access_token({
+        "sub": claims["sub"],
+        "id": claims["id"],
+        "role": claims["role"]
+    })
+    refresh_token = create_refresh_token(claims, family)
+
+    return TokenResponse(
         access_token=token,
         token_type="bearer",
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        role=user.role.value     # <--- ESTA PARTE YA ESTABA OK
+        id=claims["id"],
+        username=claims["username"],
+        email=claims["sub"],
+        role=claims["role"],
+        refresh_token=refresh_token
     )
 
-    return data_response, None
 
+def refresh_session(db: Session, refresh_token: str):
+    """
+    Renovar la sesión con rotación del refresh token: solo HMAC, sin bcrypt
+    ni consulta de usuario. Reutilizar un token ya rotado revoca su familia.
+    """
+    payload = decode_refresh_token(refresh_token)
+    if not payload:
+        return None, "Token de refresco inválido"
+
+    if revocation_store.is_revoked(db, payload["fam"]):
+        return None, "Sesión revocada"
+
+    # El INSERT del jti es atómico: si ya existía, el token se está reutilizando
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    if not revocation_store.revoke(db, payload["jti"], expires_at):
+        revoke_session_family(db, payload["fam"])
+        return None, "Token de refresco reutilizado"
+
+    claims = {key: payload[key] for key in ("sub", "id", "username", "role")}
+    return _issue_tokens(claims, payload["fam"]), None
+
+
+def revoke_session_family(db: Session, family: str):
+    """Revocar todos los refresh tokens de una familia (logout o robo detectado)"""
+    # Ningún token de la familia emitido hasta ahora vive más que esto
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    revocation_store.revoke(db, family, expires_at)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def logout_user(db: Session, refresh_token: str):
+    payload = decode_refresh_token(refresh_token)
+    if not payload:
+        return "Token de refresco inválido"
+    revoke_session_family(db, payload["fam"])
+    return None
+
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db),
+                     primary_db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    payload = decode_access_token(token)
+    if payload is None:
         raise credentials_exception
+    email: str = payload["sub"]
     
     user = db.query(User).filter(User.email == email).first()
+    if user is None and db is not primary_db:
+        # La réplica puede no tener aún un usuario recién registrado
+        user = primary_db.query(User).filter(User.email == email).first()
     if user is None:
         raise credentials_exception
     return user
+
+
+def _user_shard_session(current_user: User, db: Session):
+    # Mientras el rebalanceo mueve al usuario sus datos están a medio copiar:
+    # se rechazan sus peticiones para que no escriban en el shard de origen
+    placement = placement_for_user(db, current_user.id)
+    if placement.moving_since is not None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tus datos se están reorganizando, inténtalo en unos segundos",
+            headers={"Retry-After": str(math.ceil(settings.shard_move_grace_seconds))}
+        )
+
+    # El primario solo hacía falta para resolver el usuario: se libera su
+    # conexión y el resto de la petición usa el shard
+    db.close()
+    shard_db = session_for_placement(placement, **REQUEST_SESSION_OPTIONS)
+    shard_db.info["shard_epoch"] = placement.epoch
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+def get_user_db(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Sesión de la base donde viven los datos del diario del usuario
+    autenticado. Sin shards configurados es la sesión del primario de get_db.
+    """
+    if not SHARDING_ENABLED:
+        yield db
+        return
+    yield from _user_shard_session(current_user, db)
+
+
+def get_user_read_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db)
+):
+    """
+    Como get_user_db para handlers de solo lectura: sin shards configurados
+    mantiene el reparto entre réplicas de get_read_db. Con shards la
+    ubicación del usuario se lee del primario, ya que una réplica atrasada
+    podría no ver aún que se está moviendo o su nueva época.
+    """
+    if not SHARDING_ENABLED:
+        yield db
+        return
+    db.close()
+    yield from _user_shard_session(current_user, primary_db)
@@ -0,0 +1,185 @@
+import struct
+from typing import AsyncIterator, Optional
+
+# Bytes retenidos del principio y del final del archivo para leer cabeceras
+HEAD_SIZE = 128 * 1024
+TAIL_SIZE = 64 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Tablas de cabecera de trama MPEG (kbps / Hz)
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+class MediaMetadataExtractor:
+    """
+    Extrae metadatos leyendo solo cabeceras mientras el archivo se transmite.
+
+    Conserva los primeros HEAD_SIZE bytes y los últimos TAIL_SIZE (necesarios
+    para la duración de OGG), sin bufferizar el archivo completo. Soporta
+    PNG (ancho/alto) y WAV, MP3 y OGG Vorbis/Opus (duración, frecuencia de
+    muestreo y canales).
+    """
+
+    def __init__(self):
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.size = 0
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+        self.tail += chunk
+        if len(self.tail) > TAIL_SIZE:
+            del self.tail[:len(self.tail) - TAIL_SIZE]
+
+    async def wrap(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pasar el stream a través del extractor sin alterarlo"""
+        async for chunk in chunks:
+            self.feed(chunk)
+            yield chunk
+
+    def result(self) -> dict:
+        metadata = {
+            "width": None,
+            "height": None,
+            "duration_seconds": None,
+            "sample_rate": None,
+            "channels": None
+        }
+        head = bytes(self.head)
+        try:
+            if head.startswith(PNG_SIGNATURE):
+                metadata.update(self._parse_png(head))
+            elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                metadata.update(self._parse_wav(head))
+            elif head[:4] == b"OggS":
+                metadata.update(self._parse_ogg(head, bytes(self.tail)))
+            else:
+                metadata.update(self._parse_mp3(head, bytes(self.tail)))
+        except (struct.error, IndexError, ZeroDivisionError):
+            # Cabecera truncada o corrupta: el archivo se guarda sin metadatos
+            pass
+        return metadata
+
+    @staticmethod
+    def _parse_png(head: bytes) -> dict:
+        if head[12:16] != b"IHDR":
+            return {}
+        width, height = struct.unpack(">II", head[16:24])
+        return {"width": width, "height": height}
+
+    def _parse_wav(self, head: bytes) -> dict:
+        metadata = {}
+        byte_rate = None
+        offset = 12
+        while offset + 8 <= len(head):
+            chunk_id = head[offset:offset + 4]
+            chunk_size = struct.unpack("<I", head[offset + 4:offset + 8])[0]
+            if chunk_id == b"fmt ":
+                channels, sample_rate, byte_rate = struct.unpack("<HII", head[offset + 10:offset + 20])
+                metadata.update({"channels": channels, "sample_rate": sample_rate})
+            elif chunk_id == b"data":
+                # Grabaciones en streaming pueden dejar el tamaño a 0 o al máximo
+                if chunk_size in (0, 0xFFFFFFFF):
+                    chunk_size = self.size - offset - 8
+                if byte_rate:
+                    metadata["duration_seconds"] = round(chunk_size / byte_rate, 3)
+                break
+            offset += 8 + chunk_size + (chunk_size & 1)
+        return metadata
+
+    @staticmethod
+    def _parse_ogg(head: bytes, tail: bytes) -> dict:
+        segments = head[26]
+        payload = head[27 + segments:]
+        serial = head[14:18]
+        if payload.startswith(b"\x01vorbis"):
+            channels = payload[11]
+            sample_rate = granule_rate = struct.unpack("<I", payload[12:16])[0]
+            pre_skip = 0
+        elif payload.startswith(b"OpusHead"):
+            channels = payload[9]
+            pre_skip = struct.unpack("<H", payload[10:12])[0]
+            # La granule position de Opus siempre va a 48 kHz
+            granule_rate = 48000
+            sample_rate = struct.unpack("<I", payload[12:16])[0] or 48000
+        else:
+            return {}
+
+        metadata = {"channels": channels, "sample_rate": sample_rate}
+        # Última página del flujo lógico: su granule position da la duración
+        position = tail.rfind(b"OggS")
+        while position != -1:
+            if position + 18 <= len(tail) and tail[position + 14:position + 18] == serial:
+                granule = struct.unpack("<q", tail[position + 6:position + 14])[0]
+                if granule > 0:
+                    metadata["duration_seconds"] = round((granule - pre_skip) / granule_rate, 3)
+                break
+            position = tail.rfind(b"OggS", 0, position)
+        return metadata
+
+    def _parse_mp3(self, head: bytes, tail: bytes) -> dict:
+        offset, search = 0, 1
+        if head[:3] == b"ID3":
+            # Tamaño syncsafe de la etiqueta ID3v2 (+ pie opcional y relleno)
+            tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+            offset = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+            search = 4096
+
+        # Sin ID3 la trama debe empezar en el byte 0: evita falsos positivos
+        frame = self._find_mp3_frame(head, offset, search)
+        if frame is None:
+            return {}
+        position, version, layer, bitrate, sample_rate, channels = frame
+
+        samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+        metadata = {"sample_rate": sample_rate, "channels": channels}
+
+        # Cabecera Xing/Info (VBR) o VBRI con el número total de tramas
+        side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+        xing = position + 4 + side_info
+        frames = None
+        if head[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", head[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+        elif head[position + 36:position + 40] == b"VBRI":
+            frames = struct.unpack(">I", head[position + 50:position + 54])[0]
+
+        if frames:
+            metadata["duration_seconds"] = round(frames * samples_per_frame / sample_rate, 3)
+        elif bitrate:
+            # CBR: bytes de audio / bitrate (descontando ID3v1 si existe)
+            audio_bytes = self.size - position - (128 if tail[-128:-125] == b"TAG" else 0)
+            metadata["duration_seconds"] = round(audio_bytes * 8 / (bitrate * 1000), 3)
+        return metadata
+
+    @staticmethod
+    def _find_mp3_frame(head: bytes, offset: int, search: int) -> Optional[tuple]:
+        """Buscar la primera cabecera de trama MPEG válida en `search` bytes"""
+        limit = min(len(head) - 4, offset + search)
+        while offset < limit:
+            if head[offset] == 0xFF and head[offset + 1] & 0xE0 == 0xE0:
+                version_bits = (head[offset + 1] >> 3) & 0x03
+                layer_bits = (head[offset + 1] >> 1) & 0x03
+                bitrate_index = head[offset + 2] >> 4
+                rate_index = (head[offset + 2] >> 2) & 0x03
+                if version_bits != 1 and layer_bits != 0 and bitrate_index != 15 and rate_index != 3:
+                    version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+                    layer = 4 - layer_bits
+                    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+                    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+                    channels = 1 if head[offset + 3] >> 6 == 3 else 2
+                    return offset, version, layer, bitrate, sample_rate, channels
+            offset += 1
+        return None
@@ -0,0 +1,160 @@
+from sqlalchemy import MetaData, Sequence, create_engine, select, exists, literal, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from database import SessionLocal
+from models.diary import DiaryEntry, EmotionRecord, EmotionCatalog
+from models.media import MediaFile
+from models.sync import SyncTombstone, SyncClock
+from models.job import BackgroundJob
+from models.shard import UserShard
+from sharding.ring import HashRing
+from config import settings
+
+# Nombre del único "shard" cuando no hay shards configurados
+PRIMARY_SHARD = "primary"
+
+# Tablas que viven en cada shard. El catálogo de emociones se replica desde
+# el primario (los códigos son globales); la cola de trabajos va en el shard
+# para encolar en la misma transacción que la escritura que los origina.
+SHARD_TABLES = (
+    EmotionCatalog.__table__,
+    DiaryEntry.__table__,
+    EmotionRecord.__table__,
+    MediaFile.__table__,
+    SyncTombstone.__table__,
+    SyncClock.__table__,
+    BackgroundJob.__table__,
+)
+
+shard_engines = {name: create_engine(url, echo=True) for name, url in settings.shard_urls.items()}
+ShardSessionLocals = {
+    name: sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+    for name, shard_engine in shard_engines.items()
+} or {PRIMARY_SHARD: SessionLocal}
+SHARDING_ENABLED = bool(shard_engines)
+
+ring = HashRing(ShardSessionLocals, settings.shard_virtual_nodes)
+
+
+def ring_shard_for_user(user_id: int) -> str:
+    """Shard que el anillo asigna al usuario (adonde lo lleva el rebalanceo)"""
+    return ring.node_for(user_id)
+
+
+def data_sources() -> dict:
+    """Bases con datos del diario por nombre (el primario puede tener filas sin mover)"""
+    sources = dict(ShardSessionLocals)
+    if SHARDING_ENABLED:
+        sources[PRIMARY_SHARD] = SessionLocal
+    return sources
+
+
+def session_factory_for(shard: str):
+    try:
+        return data_sources()[shard]
+    except KeyError:
+        raise LookupError(f"El shard {shard} no está en shard_urls") from None
+
+
+def shards_with_data(user_id: int) -> list:
+    """Nombres de las bases que tienen filas del usuario"""
+    found = []
+    for name, session_factory in data_sources().items():
+        with session_factory() as db:
+            if db.scalar(select(literal(1)).where(or_(
+                exists().where(DiaryEntry.user_id == user_id),
+                exists().where(MediaFile.user_id == user_id),
+                exists().where(SyncTombstone.user_id == user_id)
+            ))) is not None:
+                found.append(name)
+    return found
+
+
+def _pin_user(user_id: int) -> UserShard:
+    # Primera vez que se enruta al usuario: se registra donde estén ya sus
+    # datos (p. ej. en el primario al activar el sharding) o, si no tiene,
+    # donde lo pone el anillo
+    found = shards_with_data(user_id)
+    with SessionLocal(expire_on_commit=False) as db:
+        placement = UserShard(user_id=user_id, shard=found[0] if found else ring_shard_for_user(user_id), epoch=0)
+        db.add(placement)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otra petición lo registró a la vez
+            db.rollback()
+            placement = db.get(UserShard, user_id)
+    return placement
+
+
+def placement_for_user(db: Session, user_id: int) -> UserShard:
+    """
+    Ubicación registrada del usuario. Manda sobre el anillo: al cambiar
+    `shard_urls` los usuarios siguen en su shard hasta que el rebalanceo los
+    mueve y actualiza la fila.
+    """
+    placement = db.get(UserShard, user_id)
+    return placement if placement is not None else _pin_user(user_id)
+
+
+def shard_for_user(db: Session, user_id: int) -> str:
+    """Shard donde viven los datos del usuario"""
+    return placement_for_user(db, user_id).shard
+
+
+def session_for_placement(placement: UserShard, **options) -> Session:
+    return session_factory_for(placement.shard)(**options)
+
+
+def data_session_factories() -> list:
+    """
+    Fábricas de sesión de todas las bases con datos del diario, para las
+    tareas que las recorren todas. Con shards incluye también el primario:
+    puede conservar filas (y trabajos encolados) aún sin rebalancear.
+    """
+    factories = list(ShardSessionLocals.values())
+    if SHARDING_ENABLED:
+        factories.append(SessionLocal)
+    return factories
+
+
+def create_shard_schema(shard_engine, index: int):
+    """
+    Crear las tablas del diario en un shard.
+
+    Los usuarios siguen en el primario, así que se omiten las claves ajenas
+    hacia tablas que no están en el shard. Las secuencias de ids empiezan en
+    `shard_id_start + index` y avanzan de `shard_id_stride` en
+    `shard_id_stride`: los ids de shards distintos (y los del primario, por
+    debajo del inicio) no chocan al mover filas entre ellos. Por eso los
+    shards nuevos se añaden siempre al final de `shard_urls`.
+    """
+    metadata = MetaData()
+    shard_names = {table.fullname for table in SHARD_TABLES}
+    sequences = {}
+    for table in SHARD_TABLES:
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            referred = constraint.elements[0].target_fullname.rsplit(".", 1)[0]
+            if referred not in shard_names:
+                copy.constraints.discard(constraint)
+                for foreign_key in constraint.elements:
+                    copy.foreign_keys.discard(foreign_key)
+                    foreign_key.parent.foreign_keys.discard(foreign_key)
+        for column in table.columns:
+            if isinstance(column.default, Sequence):
+                sequences[column.default.name] = column.default
+
+    for sequence in sequences.values():
+        Sequence(
+            sequence.name,
+            schema=sequence.schema,
+            start=settings.shard_id_start + index,
+            increment=settings.shard_id_stride
+        ).create(shard_engine, checkfirst=True)
+    metadata.create_all(shard_engine, checkfirst=True)
+
+
+def create_shard_schemas():
+    for index, shard_engine in enumerate(shard_engines.values()):
+        create_shard_schema(shard_engine, index)
@@ -0,0 +1,253 @@
+import argparse
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, insert, delete, union, update, tuple_
+from database import SessionLocal
+from models.diary import DiaryEntry, EmotionRecord
+from models.media import MediaFile
+from models.sync import SyncTombstone
+from models.shard import UserShard
+from services.EmotionCatalogService import emotion_catalog
+from sharding import data_sources, placement_for_user, ring_shard_for_user, shards_with_data
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _users_in(db) -> set:
+    return set(db.scalars(union(
+        select(DiaryEntry.user_id).distinct(),
+        select(MediaFile.user_id).distinct(),
+        select(SyncTombstone.user_id).distinct()
+    )))
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _copy_rows(source_db, target_db, table, where, order_by, key_columns, batch_size: int) -> list:
+    """
+    Copiar al destino las filas de `table` y devolver sus claves
+    (`key_columns`). El usuario está bloqueado, así que el origen manda: lo
+    que quedara en el destino de un intento anterior se reemplaza. Sin
+    `change_seq`: el destino asigna uno nuevo de su secuencia.
+    """
+    key = tuple_(*(table.c[name] for name in key_columns))
+    copied = []
+    result = source_db.execute(select(table).where(where).order_by(order_by))
+    for partition in result.mappings().partitions(batch_size):
+        keys = [tuple(row[name] for name in key_columns) for row in partition]
+        target_db.execute(delete(table).where(key.in_(keys)))
+        target_db.execute(insert(table), [
+            {name: value for name, value in row.items() if name != "change_seq"}
+            for row in partition
+        ])
+        copied.extend(keys)
+    return copied
+
+
+def _delete_copied(source_db, table, key_columns, keys: list, batch_size: int):
+    key = tuple_(*(table.c[name] for name in key_columns))
+    for batch in _chunks(keys, batch_size):
+        source_db.execute(delete(table).where(key.in_(batch)))
+
+
+def _fence(user_ids: list):
+    """Bloquear a los usuarios: sus peticiones reciben 503 hasta liberarlos"""
+    with SessionLocal() as db:
+        db.execute(
+            update(UserShard).where(UserShard.user_id.in_(user_ids)).values(moving_since=datetime.utcnow())
+        )
+        db.commit()
+
+
+def _release(user_id: int, moved_to: str = None):
+    """
+    Liberar al usuario. Si sus datos cambiaron de shard se registra el nuevo
+    y se avanza su época, lo que invalida sus cursores de sincronización.
+    """
+    with SessionLocal() as db:
+        values = {UserShard.moving_since: None}
+        if moved_to is not None:
+            values[UserShard.shard] = moved_to
+            values[UserShard.epoch] = UserShard.epoch + 1
+        db.execute(update(UserShard).where(UserShard.user_id == user_id).values(values))
+        db.commit()
+
+
+def release_stale_fences() -> int:
+    """
+    Liberar los bloqueos que dejó un rebalanceo interrumpido (solo se
+    ejecuta uno a la vez, así que al empezar cualquier bloqueo es huérfano).
+    Si los datos ya no están en el shard registrado pero sí en otro, se
+    registra ese.
+    """
+    with SessionLocal() as db:
+        fenced = db.scalars(select(UserShard).where(UserShard.moving_since.is_not(None))).all()
+    for placement in fenced:
+        found = shards_with_data(placement.user_id)
+        moved_to = found[0] if found and placement.shard not in found else None
+        logger.warning("Usuario %s: liberando bloqueo huérfano (datos en %s)", placement.user_id, found)
+        _release(placement.user_id, moved_to)
+    return len(fenced)
+
+
+def _move_user_rows(user_id: int, source_factory, target_factory, batch_size: int) -> dict:
+    """
+    Copiar las filas del usuario al destino (conservando los ids, que no
+    chocan entre shards) y, solo tras su commit, borrar del origen las
+    copiadas. Si el borrado falla, el origen sigue completo y se retiran las
+    copias del destino; si esto también falla, la siguiente copia las
+    reemplaza.
+    """
+    entries = DiaryEntry.__table__
+    emotions = EmotionRecord.__table__
+    media_files = MediaFile.__table__
+    tombstones = SyncTombstone.__table__
+
+    user_entries = select(entries.c.id).where(entries.c.user_id == user_id)
+    user_emotions = emotions.c.diary_entry_id.in_(user_entries)
+    copies = (
+        ("entries", entries, entries.c.user_id == user_id, entries.c.id, ("id",)),
+        ("emotions", emotions, user_emotions, emotions.c.id, ("id",)),
+        ("media_files", media_files, media_files.c.user_id == user_id, media_files.c.id, ("id",)),
+        ("tombstones", tombstones, tombstones.c.user_id == user_id, tombstones.c.change_seq,
+         ("entity_type", "entity_id")),
+    )
+
+    with source_factory() as source_db, target_factory() as target_db:
+        try:
+            emotion_catalog.ensure_on(target_db, source_db.scalars(
+                select(emotions.c.emotion_code).where(user_emotions).distinct()
+            ))
+            copied = {}
+            for name, table, where, order_by, key_columns in copies:
+                copied[name] = _copy_rows(source_db, target_db, table, where, order_by, key_columns, batch_size)
+            target_db.commit()
+        except Exception:
+            target_db.rollback()
+            raise
+
+        # Con las copias confirmadas, se retiran del origen (las emociones
+        # antes que sus entradas)
+        try:
+            for name, table, _, _, key_columns in reversed(copies):
+                _delete_copied(source_db, table, key_columns, copied[name], batch_size)
+            source_db.commit()
+        except Exception:
+            source_db.rollback()
+            try:
+                for name, table, _, _, key_columns in reversed(copies):
+                    _delete_copied(target_db, table, key_columns, copied[name], batch_size)
+                target_db.commit()
+            except Exception:
+                target_db.rollback()
+                logger.exception("Usuario %s: no se pudieron retirar las copias del destino", user_id)
+            raise
+
+    return {name: len(keys) for name, keys in copied.items()}
+
+
+def move_users(user_ids: list, source_name: str, target_name: str, batch_size: int = None) -> dict:
+    """
+    Mover las filas de un grupo de usuarios de un shard a otro.
+
+    Se bloquean todos a la vez (UserShard.moving_since, que comprueban
+    get_user_db y get_user_read_db) y se esperan una sola vez
+    `shard_move_grace_seconds` a que terminen sus peticiones en curso.
+    Después se mueve cada uno y se libera en cuanto termina, registrando su
+    nuevo shard. Si falla, se libera en el origen, que conserva sus datos, y
+    se sigue con el resto. Los trabajos pendientes se quedan en la cola del
+    origen.
+    """
+    batch_size = batch_size or settings.shard_rebalance_batch_size
+    sources = data_sources()
+    stats = {"users": 0, "failed": 0, "entries": 0, "emotions": 0, "media_files": 0, "tombstones": 0}
+
+    _fence(user_ids)
+    time.sleep(settings.shard_move_grace_seconds)
+
+    for user_id in user_ids:
+        try:
+            moved = _move_user_rows(user_id, sources[source_name], sources[target_name], batch_size)
+        except Exception:
+            logger.exception("Usuario %s: fallo al mover de %s a %s", user_id, source_name, target_name)
+            _release(user_id)
+            stats["failed"] += 1
+            continue
+        _release(user_id, moved_to=target_name)
+        stats["users"] += 1
+        for key, count in moved.items():
+            stats[key] += count
+    return stats
+
+
+def plan_moves(user_ids=None) -> dict:
+    """
+    Usuarios a mover agrupados por (origen, destino). El origen es su
+    ubicación registrada; las filas que haya en otra base son restos de un
+    movimiento fallido y se ignoran.
+    """
+    moves = defaultdict(list)
+    for source_name, source_factory in data_sources().items():
+        with source_factory() as db:
+            users = _users_in(db)
+        if user_ids:
+            users &= set(user_ids)
+
+        with SessionLocal() as db:
+            for user_id in sorted(users):
+                placement = placement_for_user(db, user_id)
+                if placement.shard != source_name:
+                    logger.warning(
+                        "Usuario %s: hay filas en %s pero sus datos están en %s; se ignoran",
+                        user_id, source_name, placement.shard
+                    )
+                    continue
+                target_name = ring_shard_for_user(user_id)
+                if target_name != source_name:
+                    moves[(source_name, target_name)].append(user_id)
+    return moves
+
+
+def rebalance(user_ids=None, dry_run: bool = False, batch_size: int = None) -> dict:
+    """
+    Llevar cada usuario al shard que le asigna el anillo.
+
+    Se ejecuta tras añadir shards a `shard_urls` (o al activar el sharding,
+    para sacar los datos del primario). Hasta que se mueve, cada usuario se
+    sigue enrutando a su shard registrado. Los usuarios se mueven en grupos
+    de `shard_move_batch_users`; mientras se mueve un grupo sus peticiones
+    reciben un 503. No deben ejecutarse dos rebalanceos a la vez.
+    """
+    stats = {"users": 0, "failed": 0, "entries": 0, "emotions": 0, "media_files": 0, "tombstones": 0}
+    if not dry_run:
+        release_stale_fences()
+
+    for (source_name, target_name), users in plan_moves(user_ids).items():
+        logger.info("%s usuarios: %s -> %s", len(users), source_name, target_name)
+        if dry_run:
+            stats["users"] += len(users)
+            continue
+        for group in _chunks(users, settings.shard_move_batch_users):
+            moved = move_users(group, source_name, target_name, batch_size)
+            for key, count in moved.items():
+                stats[key] += count
+
+    logger.info("Rebalanceo de shards: %s", stats)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mover los datos de cada usuario a su shard")
+    parser.add_argument("--user-id", type=int, action="append", help="Solo estos usuarios (repetible)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(rebalance(args.user_id, dry_run=args.dry_run, batch_size=args.batch_size))
@@ -0,0 +1,33 @@
+import bisect
+import hashlib
+from typing import Iterable
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Anillo de hash consistente.
+
+    Cada nodo ocupa `virtual_nodes` puntos del anillo y una clave pertenece al
+    primer punto a su derecha. Al añadir o quitar un nodo solo cambia de
+    dueño la fracción de claves que caían en sus puntos; el resto sigue donde
+    estaba.
+    """
+
+    def __init__(self, nodes: Iterable[str], virtual_nodes: int = 100):
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in nodes
+            for replica in range(virtual_nodes)
+        )
+        if not points:
+            raise ValueError("El anillo necesita al menos un nodo")
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        index = bisect.bisect(self._hashes, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
@@ -0,0 +1,32 @@
+from functools import lru_cache
+from config import settings
+from storage.base import StorageBackend, StoredObject
+from storage.local import LocalStorage
+
+
+def _build(prefix: str, local_root: str) -> StorageBackend:
+    if settings.storage_backend == "s3":
+        from storage.s3 import S3Storage
+        return S3Storage(
+            bucket=settings.s3_bucket,
+            prefix=prefix,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+            max_pool_connections=settings.s3_max_pool_connections,
+            part_size=settings.s3_multipart_part_size
+        )
+    return LocalStorage(local_root)
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    """Backend de almacenamiento configurado (compartido por todo el proceso)"""
+    return _build(settings.s3_prefix, settings.storage_local_root)
+
+
+@lru_cache
+def get_quarantine_storage() -> StorageBackend:
+    """Backend donde MediaSweeper deja los archivos huérfanos"""
+    return _build(f"{settings.s3_prefix}/quarantine".strip("/"), settings.media_quarantine_dir)
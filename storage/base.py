@@ -0,0 +1,55 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+# Tamaño de lectura por defecto para los streams
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    modified: float  # Timestamp POSIX
+
+
+class StorageBackend(ABC):
+    """
+    Interfaz de almacenamiento de archivos multimedia.
+
+    Las claves son rutas relativas con "/" (p. ej. "drawings/ab/cd/<uuid>.png");
+    `locate` devuelve el valor que se guarda en `MediaFile.file_path`.
+    """
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes],
+                         content_type: Optional[str] = None) -> int:
+        """Escribir el objeto a partir de un stream; devuelve los bytes escritos"""
+
+    @abstractmethod
+    def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Leer el objeto (o el rango [start, end] inclusivo) como stream"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        """Eliminar el objeto; devuelve False si no existía"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        """Tamaño y fecha de modificación, o None si no existe"""
+
+    @abstractmethod
+    def iter_objects(self, prefix: str) -> AsyncIterator[StoredObject]:
+        """Recorrer los objetos bajo un prefijo"""
+
+    @abstractmethod
+    def locate(self, key: str) -> str:
+        """Valor persistido en `file_path` para una clave"""
+
+    @abstractmethod
+    def key_for(self, location: str) -> str:
+        """Clave a partir de un `file_path` persistido"""
+
+    async def copy(self, source_key: str, target_key: str):
+        """Copiar un objeto; los backends pueden sobrescribirlo con una copia nativa"""
+        await self.put_stream(target_key, self.get_stream(source_key))
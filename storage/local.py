@@ -0,0 +1,108 @@
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, Optional
+import aiofiles
+import aiofiles.os
+from anyio import to_thread
+from storage.base import StorageBackend, StoredObject, CHUNK_SIZE
+
+
+class LocalStorage(StorageBackend):
+    """Almacenamiento en disco local bajo un directorio raíz"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, *key.split("/")))
+        # Evitar que una clave salga del directorio raíz
+        if os.path.commonpath([os.path.abspath(path), os.path.abspath(self.root)]) != os.path.abspath(self.root):
+            raise ValueError("Clave de almacenamiento no válida")
+        return path
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes],
+                         content_type: Optional[str] = None) -> int:
+        path = self._path(key)
+        await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura en temporal + rename para no exponer archivos a medias
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, 'wb') as out_file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    await out_file.write(chunk)
+            await aiofiles.os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+
+    async def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self._path(key), 'rb') as in_file:
+            await in_file.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await in_file.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await aiofiles.os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            result = await aiofiles.os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(key=key, size=result.st_size, modified=result.st_mtime)
+
+    def _scan(self, directory: str):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from self._scan(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                        result = entry.stat(follow_symlinks=False)
+                        key = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+                        yield StoredObject(key=key, size=result.st_size, modified=result.st_mtime)
+        except FileNotFoundError:
+            return
+
+    async def iter_objects(self, prefix: str) -> AsyncIterator[StoredObject]:
+        # os.scandir es perezoso: se recorre sin listar el árbol completo
+        for stored_object in self._scan(self._path(prefix)):
+            yield stored_object
+
+    def locate(self, key: str) -> str:
+        return self._path(key)
+
+    def key_for(self, location: str) -> str:
+        # Rutas guardadas desde Windows pueden venir con "\\"
+        location = location.replace("\\", "/")
+        return os.path.relpath(location, self.root).replace(os.sep, "/")
+
+    async def copy(self, source_key: str, target_key: str):
+        source, target = self._path(source_key), self._path(target_key)
+
+        def _link_or_copy():
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copy2(source, target)
+
+        await to_thread.run_sync(_link_or_copy)
@@ -0,0 +1,165 @@
+from typing import AsyncIterator, Optional
+from anyio import to_thread
+from storage.base import StorageBackend, StoredObject, CHUNK_SIZE
+
+# boto3 solo es necesario si se configura el backend S3
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover
+    boto3 = None
+
+# S3 exige al menos 5 MiB por parte (salvo la última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3Storage(StorageBackend):
+    """
+    Almacenamiento en un servicio compatible con S3 (AWS, MinIO, Ceph...).
+
+    Un único cliente boto3 (thread-safe) reutiliza su pool de conexiones
+    entre peticiones; las llamadas bloqueantes se ejecutan en hilos de
+    trabajo. Las subidas grandes usan multipart sin bufferizar el archivo
+    completo en memoria.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key_id: Optional[str] = None,
+                 secret_access_key: Optional[str] = None, max_pool_connections: int = 20,
+                 part_size: int = 8 * 1024 * 1024):
+        if boto3 is None:
+            raise RuntimeError("El backend S3 requiere boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(max_pool_connections=max_pool_connections, retries={"mode": "standard"})
+        )
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    @staticmethod
+    async def _run(function, **kwargs):
+        return await to_thread.run_sync(lambda: function(**kwargs))
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes],
+                         content_type: Optional[str] = None) -> int:
+        object_key = self._object_key(key)
+        extra = {"ContentType": content_type} if content_type else {}
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        size = 0
+
+        async def upload_part(body: bytes):
+            response = await self._run(
+                self.client.upload_part, Bucket=self.bucket, Key=object_key,
+                UploadId=upload_id, PartNumber=len(parts) + 1, Body=body
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        response = await self._run(
+                            self.client.create_multipart_upload,
+                            Bucket=self.bucket, Key=object_key, **extra
+                        )
+                        upload_id = response["UploadId"]
+                    await upload_part(bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+
+            if upload_id is None:
+                # Objeto pequeño: una sola petición
+                await self._run(
+                    self.client.put_object, Bucket=self.bucket, Key=object_key,
+                    Body=bytes(buffer), **extra
+                )
+            else:
+                if buffer:
+                    await upload_part(bytes(buffer))
+                await self._run(
+                    self.client.complete_multipart_upload, Bucket=self.bucket, Key=object_key,
+                    UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await self._run(
+                    self.client.abort_multipart_upload, Bucket=self.bucket,
+                    Key=object_key, UploadId=upload_id
+                )
+            raise
+        return size
+
+    async def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        kwargs = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await self._run(self.client.get_object, **kwargs)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await to_thread.run_sync(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> bool:
+        if await self.stat(key) is None:
+            return False
+        await self._run(self.client.delete_object, Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            response = await self._run(self.client.head_object, Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredObject(
+            key=key,
+            size=response["ContentLength"],
+            modified=response["LastModified"].timestamp()
+        )
+
+    async def iter_objects(self, prefix: str) -> AsyncIterator[StoredObject]:
+        kwargs = {"Bucket": self.bucket, "Prefix": self._object_key(prefix).rstrip("/") + "/"}
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        while True:
+            page = await self._run(self.client.list_objects_v2, **kwargs)
+            for item in page.get("Contents", []):
+                yield StoredObject(
+                    key=item["Key"][strip:],
+                    size=item["Size"],
+                    modified=item["LastModified"].timestamp()
+                )
+            if not page.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def locate(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def key_for(self, location: str) -> str:
+        object_key = location.removeprefix(f"s3://{self.bucket}/")
+        return object_key[len(self.prefix) + 1:] if self.prefix else object_key
+
+    async def copy(self, source_key: str, target_key: str):
+        # Copia en el servidor, sin pasar los bytes por la API
+        await self._run(
+            self.client.copy_object, Bucket=self.bucket, Key=self._object_key(target_key),
+            CopySource={"Bucket": self.bucket, "Key": self._object_key(source_key)}
+        )
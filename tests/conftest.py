@@ -0,0 +1,97 @@
+"""
+Entorno de pruebas: bases SQLite locales en lugar de Oracle.
+
+Cada base (primario, una réplica y dos shards) es un archivo con el esquema
+SINTIENDO adjunto. Las secuencias de Oracle no existen en SQLite, así que se
+quitan los valores por defecto de servidor y change_seq se toma de un
+contador del proceso. La configuración se lee al importar `config`, por eso
+el entorno se fija antes de importar la aplicación.
+"""
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="sintiendo-tests-")
+_change_seq = itertools.count(1)
+
+
+def _url(name: str) -> str:
+    return f"sqlite:///{_data_dir}/{name}.db"
+
+
+os.environ.update({
+    "DATABASE_URL": _url("primary"),
+    "READ_REPLICA_URLS": json.dumps([_url("replica")]),
+    "SHARD_URLS": json.dumps({"a": _url("a"), "b": _url("b")}),
+    "SECRET_KEY": "test-secret",
+    "FRONTEND_URL": json.dumps(["http://localhost:5173"]),
+    "MEDIA_SWEEPER_INTERVAL_SECONDS": "0",
+    "SHARD_MOVE_GRACE_SECONDS": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event, func, inspect
+from sqlalchemy.sql.schema import ColumnDefault
+import database
+import sharding
+import models.user, models.diary, models.media, models.sync, models.token, models.job, models.shard  # noqa: F401
+import services.SyncService
+from database import Base
+from services.EmotionCatalogService import emotion_catalog
+
+ENGINES = {"primary": database.engine, "replica": database.read_engines[0], **sharding.shard_engines}
+
+
+def _attach(engine, name: str):
+    engine.echo = False
+
+    @event.listens_for(engine, "connect")
+    def _connect(connection, record):
+        connection.execute(f"ATTACH DATABASE '{_data_dir}/{name}_sintiendo.db' AS SINTIENDO")
+        connection.create_function("TRUNC", 1, lambda value: value[:10] if value else value)
+        connection.create_function("next_change_seq", 0, lambda: next(_change_seq))
+
+
+for _name, _engine in ENGINES.items():
+    _attach(_engine, _name)
+
+for _table in Base.metadata.tables.values():
+    for _column in _table.columns:
+        _column.server_default = None
+    if "change_seq" in _table.c:
+        _column = _table.c.change_seq
+        _column.default = ColumnDefault(lambda context: next(_change_seq))
+        _column.default._set_parent(_column)
+        if not _column.primary_key:
+            _column.onupdate = ColumnDefault(lambda context: next(_change_seq), for_update=True)
+            _column.onupdate._set_parent(_column)
+
+
+class _ChangeSequence:
+    # INSERT ... SELECT de tombstones: un valor del contador por fila
+    def next_value(self):
+        return func.next_change_seq()
+
+
+services.SyncService.change_sequence = _ChangeSequence()
+
+Base.metadata.create_all(database.engine)
+Base.metadata.create_all(database.read_engines[0])
+sharding.create_shard_schemas()
+
+
+@pytest.fixture(autouse=True)
+def clean_databases():
+    yield
+    for engine in ENGINES.values():
+        existing = set(inspect(engine).get_table_names(schema="SINTIENDO"))
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                if table.name in existing:
+                    connection.execute(table.delete())
+    emotion_catalog._by_code.clear()
+    emotion_catalog._by_key.clear()
+    emotion_catalog._replicated.clear()
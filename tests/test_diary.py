@@ -0,0 +1,59 @@
+import base64
+from datetime import date
+import pytest
+from database import SessionLocal
+from schemas.DiarySchema import DiaryEntryCreate, DiaryEntryUpdate, EmotionCreate
+from services.DiaryService import DiaryService
+
+USER_ID = 1
+
+
+def _create_entry(db, day: int, emotions):
+    return DiaryService.create_diary_entry(db, USER_ID, DiaryEntryCreate(
+        title=f"t{day}", content="c", entry_date=date(2024, 1, day),
+        emotions=[EmotionCreate(emotion_type=name, icon=icon, intensity=intensity)
+                  for name, icon, intensity in emotions]
+    ))
+
+
+def test_summary_counts_every_icon_of_an_emotion():
+    with SessionLocal() as db:
+        _create_entry(db, 1, [("feliz", "sol", 4), ("triste", None, 2)])
+        _create_entry(db, 2, [("feliz", "luna", 2)])
+
+        summary = DiaryService.get_emotion_summary(db, USER_ID, date(2024, 1, 1), date(2024, 1, 31))
+
+    assert summary["feliz"]["count"] == 2
+    assert summary["feliz"]["total_intensity"] == 6
+    assert summary["feliz"]["average_intensity"] == 3
+    assert summary["feliz"]["icon"] in ("sol", "luna")
+    assert summary["triste"]["count"] == 1
+
+
+def test_update_rejects_a_date_taken_by_another_entry():
+    with SessionLocal() as db:
+        _create_entry(db, 1, [("feliz", None, 3)])
+        second = _create_entry(db, 2, [("triste", None, 3)])
+        entry_id = second.id
+
+        with pytest.raises(ValueError):
+            DiaryService.update_diary_entry(db, USER_ID, entry_id, DiaryEntryUpdate(entry_date=date(2024, 1, 1)))
+        db.rollback()
+
+        # Conservar su propia fecha no cuenta como duplicado
+        updated = DiaryService.update_diary_entry(db, USER_ID, entry_id, DiaryEntryUpdate(entry_date=date(2024, 1, 2)))
+        assert updated is not None
+
+
+def test_calendar_codes_line_up_with_occupied_days():
+    with SessionLocal() as db:
+        _create_entry(db, 1, [("feliz", None, 4), ("triste", None, 2)])
+        _create_entry(db, 3, [])
+        _create_entry(db, 4, [("triste", None, 5)])
+
+        calendar = DiaryService.get_calendar(db, USER_ID, 2024, 1)
+
+    assert calendar["emotions"] == ["feliz", "triste"]
+    assert calendar["codes"] == [1, 0, 2]
+    occupancy = base64.b64decode(calendar["occupancy"])
+    assert occupancy[0] == 0b1101
@@ -0,0 +1,45 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models.diary import EmotionCatalog
+import services.EmotionCatalogService as catalog_module
+from services.EmotionCatalogService import emotion_catalog
+
+
+@pytest.mark.parametrize("name, icon", [(None, None), ("  ", None), ("x" * 51, None), ("feliz", "i" * 101)])
+def test_invalid_pairs_are_rejected_before_inserting(name, icon):
+    with SessionLocal() as db:
+        with pytest.raises(HTTPException) as error:
+            emotion_catalog.code_for(db, name, icon)
+        assert error.value.status_code == 422
+        assert db.query(EmotionCatalog).count() == 0
+
+
+def test_concurrent_insert_reuses_the_other_code(monkeypatch):
+    with SessionLocal() as db:
+        db.execute(insert(EmotionCatalog).values(name="feliz", icon="sol"))
+        db.commit()
+        # La caché no lo conoce todavía y su primera carga tampoco lo ve
+        load = emotion_catalog._load
+        calls = []
+
+        def stale_first_load(catalog_db=None):
+            calls.append(catalog_db)
+            if len(calls) > 1:
+                load(catalog_db)
+
+        monkeypatch.setattr(emotion_catalog, "_load", stale_first_load)
+        code = emotion_catalog.code_for(db, "feliz", "sol")
+        assert code == db.query(EmotionCatalog.code).scalar()
+
+
+def test_other_integrity_errors_are_raised(monkeypatch):
+    with SessionLocal() as db:
+        db.execute(insert(EmotionCatalog).values(code=1, name="otra"))
+        db.commit()
+    # Un alta que falla por otra restricción (aquí, un código repetido)
+    monkeypatch.setattr(catalog_module, "insert", lambda table: insert(table).values(code=1))
+    with SessionLocal() as db, pytest.raises(IntegrityError):
+        emotion_catalog.code_for(db, "feliz")
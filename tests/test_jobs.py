@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import oracle
+from sqlalchemy.orm import Query
+from database import SessionLocal
+from jobs import HANDLERS, enqueue
+from jobs.worker import JobWorker
+from models.job import BackgroundJob, JOB_DONE, JOB_FAILED, JOB_RUNNING
+
+
+def _worker():
+    return JobWorker(session_factories=[SessionLocal], concurrency=2, poll_interval=0, lease_seconds=60)
+
+
+def _enqueue(job_type="prueba", payload=None, max_attempts=None):
+    with SessionLocal() as db:
+        enqueue(db, job_type, payload or {"n": 1}, max_attempts=max_attempts)
+        db.commit()
+
+
+def _job():
+    with SessionLocal() as db:
+        return db.query(BackgroundJob).one()
+
+
+def test_claim_locks_the_job_with_skip_locked(monkeypatch):
+    # SQLite no emite FOR UPDATE: se comprueba la consulta compilada para Oracle
+    locking = []
+    with_for_update = Query.with_for_update
+
+    def spy(self, **kwargs):
+        query = with_for_update(self, **kwargs)
+        locking.append(query)
+        return query
+
+    monkeypatch.setattr(Query, "with_for_update", spy)
+    _enqueue()
+
+    claimed = _worker().claim()
+
+    assert len(claimed) == 1
+    sql = str(locking[0].statement.compile(dialect=oracle.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    job = _job()
+    assert job.status == JOB_RUNNING
+    assert job.attempts == 1
+    assert job.locked_by == claimed[0]["locked_by"]
+    assert job.locked_until > datetime.utcnow()
+    # Mientras dura el bloqueo nadie más lo reclama
+    assert _worker().claim() == []
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_worker_cannot_finish():
+    _enqueue()
+    stale = _worker().claim()[0]
+    with SessionLocal() as db:
+        db.query(BackgroundJob).update({BackgroundJob.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+
+    worker = _worker()
+    current = worker.claim()[0]
+    assert current["locked_by"] != stale["locked_by"]
+    assert current["attempts"] == 2
+
+    # El worker que perdió el bloqueo no pisa el estado del nuevo dueño
+    assert not worker._finish(stale, {BackgroundJob.status: JOB_DONE})
+    job = _job()
+    assert job.status == JOB_RUNNING
+    assert job.locked_by == current["locked_by"]
+
+    assert worker._finish(current, {BackgroundJob.status: JOB_DONE})
+    job = _job()
+    assert job.status == JOB_DONE
+    assert job.locked_by is None
+
+
+def test_run_until_empty_runs_the_registered_handler(monkeypatch):
+    received = []
+    monkeypatch.setitem(HANDLERS, "prueba", received.append)
+    _enqueue(payload={"n": 7})
+
+    assert _worker().run_until_empty() == 1
+    assert received == [{"n": 7}]
+    assert _job().status == JOB_DONE
+
+
+def test_failure_on_the_last_attempt_marks_the_job_failed(monkeypatch):
+    def fail(payload):
+        raise RuntimeError("sin conexión")
+
+    monkeypatch.setitem(HANDLERS, "prueba", fail)
+    _enqueue(max_attempts=1)
+
+    assert _worker().run_until_empty() == 1
+    job = _job()
+    assert job.status == JOB_FAILED
+    assert job.last_error == "sin conexión"
+    assert job.finished_at is not None
@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timedelta
+from database import SessionLocal
+from jobs.leases import acquire_lease, release_lease
+from models.job import MaintenanceLease
+from services.MediaSweeper import MediaSweeper, SWEEPER_LEASE
+
+
+def test_only_one_holder_at_a_time():
+    assert acquire_lease("tarea", "a", 60)
+    assert not acquire_lease("tarea", "b", 60)
+    # El dueño puede renovarlo
+    assert acquire_lease("tarea", "a", 60)
+
+    release_lease("tarea", "b")
+    assert not acquire_lease("tarea", "b", 60)
+    release_lease("tarea", "a")
+    assert acquire_lease("tarea", "b", 60)
+
+
+def test_expired_lease_can_be_taken():
+    assert acquire_lease("tarea", "a", 60)
+    with SessionLocal() as db:
+        db.query(MaintenanceLease).update({MaintenanceLease.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+    assert acquire_lease("tarea", "b", 60)
+
+
+def test_sweeper_skips_while_another_process_sweeps():
+    assert acquire_lease(SWEEPER_LEASE, "otro-proceso", 60)
+    sweeper = MediaSweeper(storage=object(), quarantine=False)
+    assert asyncio.run(sweeper.run_once()) == {"skipped": True}
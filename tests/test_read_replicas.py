@@ -0,0 +1,51 @@
+import time
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+import main
+from database import LAST_WRITE_HEADER, get_db, get_read_db
+from models.user import User, RoleEnum
+
+ORIGIN = "http://localhost:5173"
+
+
+def _client() -> TestClient:
+    """App con el middleware de main y dos rutas que escriben y leen usuarios"""
+    app = FastAPI()
+    app.user_middleware = list(main.app.user_middleware)
+
+    @app.post("/probe/users")
+    def write(db: Session = Depends(get_db)):
+        db.add(User(username="nuevo", email="nuevo@example.com", hashed_password="x", role=RoleEnum.ADULTO))
+        db.commit()
+        return {}
+
+    @app.get("/probe/users")
+    def read(db: Session = Depends(get_read_db)):
+        return [username for (username,) in db.query(User.username)]
+
+    return TestClient(app)
+
+
+def test_cross_site_client_reads_its_write_from_the_primary():
+    writer = _client()
+    response = writer.post("/probe/users", headers={"Origin": ORIGIN})
+    assert response.status_code == 200
+    # El navegador solo deja leer la cabecera si CORS la expone
+    assert LAST_WRITE_HEADER.lower() in response.headers["access-control-expose-headers"].lower()
+    marker = response.headers[LAST_WRITE_HEADER]
+    # En el mismo sitio basta la cookie
+    assert writer.get("/probe/users").json() == ["nuevo"]
+
+    # Otro cliente sin cookies (como el SPA en otro sitio) reenvía la cabecera
+    spa = _client()
+    assert spa.get("/probe/users", headers={"Origin": ORIGIN, LAST_WRITE_HEADER: marker}).json() == ["nuevo"]
+    # Sin marca se lee de la réplica, que aún no tiene la fila
+    assert spa.get("/probe/users", headers={"Origin": ORIGIN}).json() == []
+
+
+def test_old_or_future_markers_read_from_the_replica():
+    _client().post("/probe/users")
+    client = _client()
+    for marker in (time.time() - 3600, time.time() + 3600, "no-es-un-numero"):
+        assert client.get("/probe/users", headers={LAST_WRITE_HEADER: str(marker)}).json() == []
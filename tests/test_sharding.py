@@ -0,0 +1,165 @@
+from datetime import date, datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from database import SessionLocal
+from models.user import User, RoleEnum
+from models.diary import DiaryEntry, EmotionRecord
+from models.shard import UserShard
+from routers.DiaryRouter import router as diary_router
+from services.EmotionCatalogService import emotion_catalog
+from services.utils import create_access_token
+from sharding import PRIMARY_SHARD, data_sources, placement_for_user, ring_shard_for_user
+from sharding import rebalance as rebalance_module
+from sharding.rebalance import rebalance, release_stale_fences
+
+USER_IDS = range(1, 7)
+
+
+def _add_users(user_ids):
+    with SessionLocal() as db:
+        for user_id in user_ids:
+            db.add(User(
+                id=user_id, username=f"u{user_id}", email=f"u{user_id}@example.com",
+                hashed_password="x", role=RoleEnum.ADULTO
+            ))
+        db.commit()
+
+
+def _add_entries(shard: str, user_ids):
+    session_factory = data_sources()[shard]
+    with session_factory() as db:
+        code = emotion_catalog.code_for(db, "feliz")
+        for user_id in user_ids:
+            db.add(DiaryEntry(id=user_id, user_id=user_id, title=f"t{user_id}", content="c",
+                              entry_date=date(2024, 1, user_id)))
+            db.add(EmotionRecord(id=user_id, diary_entry_id=user_id, emotion_code=code, intensity=3))
+        db.commit()
+
+
+def _entry_users(shard: str) -> set:
+    with data_sources()[shard]() as db:
+        return {user_id for (user_id,) in db.query(DiaryEntry.user_id)}
+
+
+def _placements() -> dict:
+    with SessionLocal() as db:
+        return {placement.user_id: placement for placement in db.query(UserShard)}
+
+
+@pytest.fixture
+def legacy_users():
+    """Usuarios con datos en el primario, como antes de activar los shards"""
+    _add_users(USER_IDS)
+    _add_entries(PRIMARY_SHARD, USER_IDS)
+    return list(USER_IDS)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(rebalance_module.time, "sleep", calls.append)
+    return calls
+
+
+def test_unmoved_users_are_routed_to_their_data(legacy_users):
+    _add_users([7])
+    with SessionLocal() as db:
+        assert placement_for_user(db, 1).shard == PRIMARY_SHARD
+        assert placement_for_user(db, 7).shard == ring_shard_for_user(7)
+
+
+def test_rebalance_moves_users_in_batches(legacy_users, sleeps):
+    stats = rebalance()
+
+    assert stats["users"] == len(legacy_users) and stats["failed"] == 0
+    assert stats["entries"] == stats["emotions"] == len(legacy_users)
+    # Una espera por grupo (origen, destino), no una por usuario
+    targets = {ring_shard_for_user(user_id) for user_id in legacy_users}
+    assert len(sleeps) == len(targets)
+
+    assert _entry_users(PRIMARY_SHARD) == set()
+    placements = _placements()
+    for user_id in legacy_users:
+        target = ring_shard_for_user(user_id)
+        assert user_id in _entry_users(target)
+        assert placements[user_id].shard == target
+        assert placements[user_id].epoch == 1
+        assert placements[user_id].moving_since is None
+
+
+def test_failed_copy_releases_the_user(legacy_users, sleeps, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("destino caído")
+
+    monkeypatch.setattr(rebalance_module, "_copy_rows", fail)
+    stats = rebalance()
+
+    assert stats["users"] == 0 and stats["failed"] == len(legacy_users)
+    assert _entry_users(PRIMARY_SHARD) == set(legacy_users)
+    assert _entry_users("a") == _entry_users("b") == set()
+    for placement in _placements().values():
+        assert placement.shard == PRIMARY_SHARD
+        assert placement.epoch == 0
+        assert placement.moving_since is None
+
+
+def test_failed_source_delete_keeps_the_source(legacy_users, sleeps, monkeypatch):
+    delete_copied = rebalance_module._delete_copied
+    primary_bind = SessionLocal.kw["bind"]
+
+    def fail_on_source(db, *args):
+        if db.get_bind() is primary_bind:
+            raise RuntimeError("origen caído")
+        delete_copied(db, *args)
+
+    monkeypatch.setattr(rebalance_module, "_delete_copied", fail_on_source)
+    stats = rebalance()
+
+    assert stats["failed"] == len(legacy_users)
+    assert _entry_users(PRIMARY_SHARD) == set(legacy_users)
+    # Las copias confirmadas en el destino se retiran
+    assert _entry_users("a") == _entry_users("b") == set()
+    assert {placement.shard for placement in _placements().values()} == {PRIMARY_SHARD}
+
+
+def test_stale_fence_is_released_where_the_data_is(legacy_users):
+    with SessionLocal() as db:
+        placement_for_user(db, 1)
+        placement_for_user(db, 2)
+    with SessionLocal() as db:
+        db.query(UserShard).update({UserShard.moving_since: datetime.utcnow()})
+        db.commit()
+    # El usuario 2 llegó a moverse al shard "a" antes de la interrupción
+    with data_sources()[PRIMARY_SHARD]() as db:
+        db.query(EmotionRecord).filter(EmotionRecord.diary_entry_id == 2).delete()
+        db.query(DiaryEntry).filter(DiaryEntry.user_id == 2).delete()
+        db.commit()
+    _add_entries("a", [2])
+
+    assert release_stale_fences() == 2
+    placements = _placements()
+    assert (placements[1].shard, placements[1].epoch, placements[1].moving_since) == (PRIMARY_SHARD, 0, None)
+    assert (placements[2].shard, placements[2].epoch, placements[2].moving_since) == ("a", 1, None)
+
+
+def test_fenced_user_gets_503(legacy_users):
+    with SessionLocal() as db:
+        placement_for_user(db, 1)
+        db.query(UserShard).filter(UserShard.user_id == 1).update({UserShard.moving_since: datetime.utcnow()})
+        db.commit()
+
+    app = FastAPI()
+    app.include_router(diary_router)
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "u1@example.com", "id": 1})}
+
+    for path in ("/diary/entries", "/diary/changes"):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+    release_stale_fences()
+    response = client.get("/diary/entries", headers=headers)
+    assert response.status_code == 200
+    assert [entry["title"] for entry in response.json()] == ["t1"]
@@ -0,0 +1,61 @@
+from datetime import date
+from database import SessionLocal
+from models.sync import SyncClock
+from schemas.DiarySchema import DiaryEntryCreate, DiaryEntryUpdate, EmotionCreate
+from services.DiaryService import DiaryService
+from services.SyncService import SyncService
+
+USER_ID = 1
+
+
+def _create_entries(db, days):
+    return [
+        DiaryService.create_diary_entry(db, USER_ID, DiaryEntryCreate(
+            title=f"t{day}", content="c", entry_date=date(2024, 1, day),
+            emotions=[EmotionCreate(emotion_type="feliz", intensity=3)]
+        ))
+        for day in days
+    ]
+
+
+def test_cursor_is_the_last_visible_change():
+    with SessionLocal() as db:
+        _create_entries(db, [1, 2])
+        changes = SyncService.get_changes(db, USER_ID)
+
+        assert len(changes["entries"]) == 2 and len(changes["emotions"]) == 2
+        last_seq = max(row.change_seq for name in ("entries", "emotions") for row in changes[name])
+        assert changes["cursor"] == last_seq and not changes["has_more"]
+
+        # Un cliente sin cambios nuevos no vuelve a recibir los anteriores
+        idle = SyncService.get_changes(db, USER_ID, changes["cursor"])
+        assert idle["cursor"] == changes["cursor"]
+        assert idle["entries"] == idle["emotions"] == []
+
+
+def test_incremental_changes_after_cursor():
+    with SessionLocal() as db:
+        entry_id = _create_entries(db, [1, 2])[0].id
+        cursor = SyncService.get_changes(db, USER_ID)["cursor"]
+
+        DiaryService.update_diary_entry(db, USER_ID, entry_id, DiaryEntryUpdate(title="nuevo"))
+        DiaryService.delete_diary_entry(db, USER_ID, entry_id)
+        changes = SyncService.get_changes(db, USER_ID, cursor)
+
+        assert {(row.entity_type, row.entity_id) for row in changes["deleted"]} >= {("entry", entry_id)}
+        assert changes["cursor"] > cursor
+
+
+def test_writes_lock_the_user_clock():
+    with SessionLocal() as db:
+        SyncService.lock_changes(db, USER_ID)
+        SyncService.lock_changes(db, USER_ID)
+        assert db.info["change_locks"] == {USER_ID}
+        db.commit()
+        assert "change_locks" not in db.info
+        assert db.query(SyncClock.user_id).all() == [(USER_ID,)]
+
+        # La fila ya existe: se bloquea sin volver a crearla
+        SyncService.lock_changes(db, USER_ID)
+        db.commit()
+        assert db.query(SyncClock.user_id).all() == [(USER_ID,)]